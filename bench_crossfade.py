@@ -0,0 +1,132 @@
+# Micro-benchmark of one step of a crossfade between two frames at screen
+# resolution (1080p by default). Compares blending with pygame surface
+# alpha and with NumPy floats, which allocate new images every step, with
+# integer NumPy arithmetic and cv2.addWeighted into preallocated buffers
+# (what Crossfader uses). Reports the time per step, the peak memory
+# allocated per step by Python and NumPy, and how many steps fit in a fade
+# for a given CPU budget.
+
+import argparse
+import os
+import time
+import tracemalloc
+
+# pygame surfaces do not need a real display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import cv2
+import numpy as np
+import pygame
+
+from slow_movie.cli import size_argument
+from slow_movie.crossfade import MAX_STEPS, MIN_STEPS
+
+
+def pygame_alpha(previous_surface, current_surface):
+    ''' The naive way: copy the old frame and blit the new one over it with alpha '''
+    def step(weight):
+        blended = previous_surface.copy()
+        faded = current_surface.copy()
+        faded.set_alpha(int(weight * 255))
+        blended.blit(faded, (0, 0))
+        return blended
+    return step
+
+
+def numpy_float(previous, current):
+    ''' Floating point NumPy, allocating new arrays every step '''
+    def step(weight):
+        return (previous * (1.0 - weight) + current * weight).astype(np.uint8)
+    return step
+
+
+def numpy_integer(previous, current):
+    ''' Integer NumPy into preallocated buffers: (a * (256 - w) + b * w) >> 8 '''
+    total = np.empty(previous.shape, np.uint16)
+    scratch = np.empty(previous.shape, np.uint16)
+    blend = np.empty_like(previous)
+
+    def step(weight):
+        w = int(weight * 256)
+        np.multiply(previous, 256 - w, out=total, dtype=np.uint16)
+        np.multiply(current, w, out=scratch, dtype=np.uint16)
+        # in place through out=, so total stays the closure's buffer
+        np.add(total, scratch, out=total)
+        np.right_shift(total, 8, out=total)
+        blend[...] = total
+        return blend
+    return step
+
+
+def add_weighted(previous, current):
+    ''' cv2.addWeighted into a preallocated buffer, as Crossfader does '''
+    blend = np.empty_like(previous)
+
+    def step(weight):
+        cv2.addWeighted(previous, 1.0 - weight, current, weight, 0.0, dst=blend)
+        return blend
+    return step
+
+
+def run(label, step, count):
+    ''' Runs 'count' steps and returns (ms per step, KB allocated at peak per step) '''
+    step(0.5)   # warm up
+    tracemalloc.start()
+    elapsed = 0.0
+    peak_bytes = 0
+    for i in range(count):
+        weight = (i % MAX_STEPS + 1) / (MAX_STEPS + 1)
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        result = step(weight)
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - before
+        del result
+    tracemalloc.stop()
+    ms_per_step = elapsed / count * 1000
+    kb_per_step = peak_bytes / count / 1024
+    print(f"{label:<24} {ms_per_step:8.2f} ms/step {kb_per_step:12,.0f} KB allocated/step")
+    return ms_per_step, kb_per_step
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark one step of a crossfade between two frames"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-S", "--screen_size", type=size_argument, default="1920x1080"
+    ,help="size of the screen the frames are blended at, WIDTHxHEIGHT")
+parser.add_argument("-c", "--count", type=int, default=100
+    ,help="number of steps to time with each method")
+parser.add_argument("-d", "--duration", type=float, default=2.0
+    ,help="length of a fade in seconds, to show how many steps fit in the budget")
+parser.add_argument("-b", "--budget", type=float, default=0.25
+    ,help="share of the fade time the processor may spend blending")
+
+args = parser.parse_args()
+
+pygame.init()
+screen = pygame.display.set_mode(args.screen_size)
+width, height = args.screen_size
+rng = np.random.default_rng(0)
+previous = rng.integers(0, 256, (height, width, 3), np.uint8)
+current = rng.integers(0, 256, (height, width, 3), np.uint8)
+previous_surface = pygame.image.frombuffer(previous, args.screen_size, 'RGB').convert()
+current_surface = pygame.image.frombuffer(current, args.screen_size, 'RGB').convert()
+
+print(f"{args.count} crossfade steps at {width}x{height}")
+results = {
+    "pygame alpha": run("pygame alpha", pygame_alpha(previous_surface, current_surface), args.count),
+    "numpy float": run("numpy float", numpy_float(previous, current), args.count),
+    "numpy integer": run("numpy integer (reuse)", numpy_integer(previous, current), args.count),
+    "cv2.addWeighted": run("cv2.addWeighted (reuse)", add_weighted(previous, current), args.count),
+}
+
+# the same sum Crossfader.plan_steps() makes, without the time to present a step
+ms_per_step = results["cv2.addWeighted"][0]
+affordable = int(args.duration * args.budget / (ms_per_step / 1000))
+steps = max(MIN_STEPS, min(MAX_STEPS, affordable))
+print(f"A {args.duration:g} second fade with a {args.budget * 100:.0f}% CPU budget can use {steps} steps "
+      f"({affordable:,} would fit, at most {MAX_STEPS} are used)")
+pygame.quit()
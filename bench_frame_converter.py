@@ -0,0 +1,100 @@
+# Micro-benchmark for turning decoded frames into surfaces ready to blit.
+# Compares the original path (cvtColor, tobytes, frombytes, transform.scale)
+# with FrameConverter (cv2.resize and cvtColor into reused buffers, frombuffer).
+# Reports the time per frame and the peak memory allocated per frame by
+# Python and NumPy (memory allocated inside SDL is not visible to tracemalloc).
+
+import argparse
+import os
+import time
+import tracemalloc
+
+# pygame surfaces do not need a real display
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import cv2
+import numpy as np
+import pygame
+
+from slow_movie.cli import size_argument
+from slow_movie.frame_converter import FrameConverter, fit_geometry
+
+
+def original_path(frame, screen_size):
+    ''' The per-frame conversion the player used before FrameConverter '''
+    frame_RGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame_string = frame_RGB.tobytes()
+    frame_size = (frame_RGB.shape[1], frame_RGB.shape[0])
+    image = pygame.image.frombytes(frame_string, frame_size, 'RGB', False)
+    scaled_size, position, _ = fit_geometry(image.get_width(), image.get_height(), *screen_size)
+    return pygame.transform.scale(image, scaled_size), position
+
+
+def load_frames(mp4_file, count, frame_size):
+    ''' Returns 'count' BGR frames from the movie, or random frames of frame_size '''
+    if mp4_file:
+        frames = []
+        cap = cv2.VideoCapture(mp4_file)
+        while len(frames) < count:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+        return frames
+    width, height = frame_size
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, (height, width, 3), np.uint8) for _ in range(min(count, 8))]
+
+
+def run(label, convert, frames, count):
+    ''' Converts 'count' frames and returns (ms per frame, KB allocated at peak per frame) '''
+    convert(frames[0])   # warm up: first call allocates the reused buffers
+    tracemalloc.start()
+    elapsed = 0.0
+    peak_bytes = 0
+    for i in range(count):
+        frame = frames[i % len(frames)]
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        surface, _ = convert(frame)
+        elapsed += time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        peak_bytes += peak - before
+        del surface
+    tracemalloc.stop()
+    ms_per_frame = elapsed / count * 1000
+    kb_per_frame = peak_bytes / count / 1024
+    print(f"{label:<16} {ms_per_frame:8.2f} ms/frame {kb_per_frame:12,.0f} KB allocated/frame")
+    return ms_per_frame, kb_per_frame
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark converting decoded frames into surfaces scaled for the screen"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-m", "--mp4", default=None
+    ,help="take frames from this movie instead of generating them")
+parser.add_argument("-s", "--frame_size", type=size_argument, default="3840x2160"
+    ,help="size of the generated frames, WIDTHxHEIGHT")
+parser.add_argument("-S", "--screen_size", type=size_argument, default="1280x720"
+    ,help="size of the screen to scale to, WIDTHxHEIGHT")
+parser.add_argument("-c", "--count", type=int, default=100
+    ,help="number of frames to convert with each method")
+
+args = parser.parse_args()
+
+frames = load_frames(args.mp4, args.count, args.frame_size)
+if not frames:
+    parser.error(f"No frames could be read from '{args.mp4}'")
+
+height, width = frames[0].shape[:2]
+print(f"{args.count} frames of {width}x{height} scaled to {args.screen_size[0]}x{args.screen_size[1]}")
+
+converter = FrameConverter(args.screen_size, scale=True, buffers=2)
+old_ms, old_kb = run("original", lambda frame: original_path(frame, args.screen_size), frames, args.count)
+new_ms, new_kb = run("FrameConverter", converter.convert, frames, args.count)
+
+print(f"FrameConverter takes {new_ms / old_ms * 100:.0f}% of the time and "
+      f"{(new_kb / old_kb * 100) if old_kb else 0:.0f}% of the allocations of the original path")
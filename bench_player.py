@@ -0,0 +1,236 @@
+# Headless benchmark of the slow movie player's per-frame pipeline.
+#
+# Runs with SDL's dummy video driver, so no display is needed. Uses
+# Test-2s.mp4 and synthetic movies generated at 720p, 1080p and 4K with
+# different GOP (key frame interval) lengths, and times every stage of
+# showing a frame separately: open, frame count, seek, decode, color
+# convert, scale, text overlay and flip. Each movie is read sequentially,
+# strided (like --frames_increment) and at random frames. The results are
+# written as JSON so runs on different hardware and releases can be compared.
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import cv2
+import numpy as np
+import pygame
+
+from slow_movie.cli import size_argument
+from slow_movie.debug_overlay import DebugOverlay
+from slow_movie.frame_converter import fit_geometry
+from slow_movie.presenter import Presenter
+from slow_movie.video_decoder import DecoderSession, scan_keyframes
+from slow_movie.video_index import probe_video
+
+STAGES = ("open", "frame_count", "seek", "decode", "color_convert", "scale", "text_overlay", "flip")
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+
+def generate_video(filename, size, frame_count, gop, fps=24):
+    ''' Writes a synthetic movie with moving content so every frame is different.
+    The key frame interval is requested through OPENCV_FFMPEG_WRITER_OPTIONS;
+    builds of OpenCV that ignore it use the encoder's default. '''
+    saved_options = os.environ.get("OPENCV_FFMPEG_WRITER_OPTIONS")
+    os.environ["OPENCV_FFMPEG_WRITER_OPTIONS"] = f"g;{gop}"
+    width, height = size
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    try:
+        if not writer.isOpened():
+            return False
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        rng = np.random.default_rng(0)
+        for i in range(frame_count):
+            frame = np.empty((height, width, 3), np.uint8)
+            frame[..., 0] = (x + i * 4) % 256
+            frame[..., 1] = (y + i * 2) % 256
+            frame[..., 2] = rng.integers(0, 64, (height, width), np.uint8)
+            cv2.putText(frame, f"{i}", (width // 10, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        height / 100, (255, 255, 255), max(1, height // 100))
+            writer.write(frame)
+    finally:
+        writer.release()
+        if saved_options is None:
+            del os.environ["OPENCV_FFMPEG_WRITER_OPTIONS"]
+        else:
+            os.environ["OPENCV_FFMPEG_WRITER_OPTIONS"] = saved_options
+    return True
+
+
+def frame_numbers(pattern, total_frames, count, stride):
+    ''' The frames to show for an access pattern '''
+    if pattern == "sequential":
+        return list(range(min(count, total_frames)))
+    if pattern == "strided":
+        return list(range(0, total_frames, stride))[:count]
+    rng = random.Random(0)
+    return [rng.randrange(total_frames) for _ in range(count)]
+
+
+def summarize(timings):
+    ''' Milliseconds statistics for a list of durations in seconds '''
+    if not timings:
+        return None
+    ms = sorted(t * 1000 for t in timings)
+    return {
+        "count": len(ms),
+        "mean_ms": statistics.fmean(ms),
+        "p50_ms": ms[len(ms) // 2],
+        "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+        "max_ms": ms[-1],
+    }
+
+
+def run_pattern(video_filename, pattern, screen, count, stride):
+    ''' Shows frames of the movie with the given access pattern and times each stage '''
+    timings = {stage: [] for stage in STAGES}
+    screen_width, screen_height = screen.get_size()
+
+    start = time.perf_counter()
+    decoder = DecoderSession(video_filename)
+    timings["open"].append(time.perf_counter() - start)
+    if not decoder.is_open():
+        return None
+
+    start = time.perf_counter()
+    probed = probe_video(video_filename)
+    timings["frame_count"].append(time.perf_counter() - start)
+    total_frames = probed[1]["frame_count"] if probed else decoder.total_frames
+
+    scaled_size, position, _ = fit_geometry(decoder.width, decoder.height, screen_width, screen_height)
+    scaled = np.empty((scaled_size[1], scaled_size[0], 3), np.uint8)
+    rgb = np.empty_like(scaled)
+    overlay = DebugOverlay()
+    presenter = Presenter(screen)
+
+    try:
+        for frame_number in frame_numbers(pattern, total_frames, count, stride):
+            start = time.perf_counter()
+            if not decoder.seek(frame_number):
+                break
+            seeked = time.perf_counter()
+            frame = decoder.decode()
+            decoded = time.perf_counter()
+            if frame is None:
+                break
+            timings["seek"].append(seeked - start)
+            timings["decode"].append(decoded - seeked)
+
+            start = time.perf_counter()
+            cv2.resize(frame, scaled_size, dst=scaled, interpolation=cv2.INTER_AREA)
+            timings["scale"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=rgb)
+            image = pygame.image.frombuffer(rgb, scaled_size, 'RGB')
+            timings["color_convert"].append(time.perf_counter() - start)
+
+            # the same work as the player's debug overlay
+            start = time.perf_counter()
+            overlay.draw(image, video_filename, f"Frame {frame_number:,} of {total_frames:,}")
+            timings["text_overlay"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            presenter.present(image, position)
+            timings["flip"].append(time.perf_counter() - start)
+    finally:
+        decoder.release()
+
+    return {stage: summarize(values) for stage, values in timings.items()}
+
+
+def environment():
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "pygame": pygame.version.ver,
+        "numpy": np.__version__,
+    }
+
+
+parser = argparse.ArgumentParser(
+    description="Headless benchmark of the slow movie player's per-frame pipeline"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-o", "--output", default="bench_results.json"
+    ,help="file to write the JSON results to")
+parser.add_argument("-r", "--resolutions", nargs="*", default=list(RESOLUTIONS), choices=list(RESOLUTIONS)
+    ,help="synthetic movie resolutions to generate")
+parser.add_argument("-g", "--gops", nargs="*", type=int, default=[12, 250]
+    ,help="key frame intervals of the synthetic movies")
+parser.add_argument("-l", "--length", type=int, default=300
+    ,help="number of frames in each synthetic movie")
+parser.add_argument("-c", "--count", type=int, default=50
+    ,help="number of frames to show for each access pattern")
+parser.add_argument("-f", "--frames_increment", type=int, default=10
+    ,help="frame increment for the strided access pattern")
+parser.add_argument("-S", "--screen_size", type=size_argument, default="1280x720"
+    ,help="size of the (dummy) screen, WIDTHxHEIGHT")
+parser.add_argument("-m", "--mp4", nargs="*", default=["Test-2s.mp4"]
+    ,help="existing movies to include")
+
+args = parser.parse_args()
+screen_size = args.screen_size
+
+pygame.init()
+screen = pygame.display.set_mode(screen_size)
+
+with tempfile.TemporaryDirectory(prefix="smp_bench_") as work_directory:
+    movies = [(mp4, None) for mp4 in args.mp4 if os.path.exists(mp4)]
+    for resolution in args.resolutions:
+        for gop in args.gops:
+            filename = os.path.join(work_directory, f"synthetic_{resolution}_gop{gop}.mp4")
+            print(f"Generating {filename}")
+            if generate_video(filename, RESOLUTIONS[resolution], args.length, gop):
+                movies.append((filename, gop))
+            else:
+                print(f"Error: Could not write '{filename}'")
+
+    results = []
+    for video_filename, gop in movies:
+        probed = probe_video(video_filename)
+        if probed is None:
+            print(f"Error: Could not open video file '{video_filename}'.")
+            continue
+        metadata = probed[1]
+        keyframes = scan_keyframes(video_filename)
+        for pattern in ("sequential", "strided", "random"):
+            stages = run_pattern(video_filename, pattern, screen, args.count, args.frames_increment)
+            if stages is None:
+                continue
+            results.append({
+                "video": os.path.basename(video_filename),
+                "width": metadata["width"],
+                "height": metadata["height"],
+                "frames": metadata["frame_count"],
+                "requested_gop": gop,
+                "keyframes": len(keyframes) if keyframes else None,
+                "pattern": pattern,
+                "stages": stages,
+            })
+            per_frame = sum(stages[s]["mean_ms"] for s in STAGES[2:] if stages[s])
+            print(f"{os.path.basename(video_filename):<32} {pattern:<10} {per_frame:8.2f} ms per frame")
+
+pygame.quit()
+
+with open(args.output, "w") as file:
+    json.dump({"environment": environment(), "screen": list(screen_size), "results": results}, file, indent=2)
+print(f"Results written to {args.output}")
@@ -0,0 +1,139 @@
+# Soak test of the slow movie player's memory use over thousands of frames.
+#
+# Runs the player's own frame pipeline (decoder, frame converter, prefetch
+# thread and presenter) as fast as frames can be prepared, with SDL's dummy
+# video driver so no display is needed, and samples the resident memory
+# (RSS) of the process as it goes. Memory use is flat when RSS stops growing
+# once the first frames are shown; the growth after the warm-up, the growth
+# per 1,000 frames and the peak are reported, and the samples are written
+# as JSON. Run it with and without --memory_budget to compare.
+
+import argparse
+import json
+import os
+import time
+
+# the frames are presented to a dummy screen
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from slow_movie.cli import build_parser, check_arguments, size_argument
+from slow_movie.metrics import process_rss_bytes
+from slow_movie.player import BLACK_RGB, Player
+from slow_movie.presenter import Presenter
+
+MB = 1024 * 1024
+
+
+def growth_per_thousand(samples):
+    ''' Least squares slope of RSS against frames, in bytes per 1,000 frames '''
+    if len(samples) < 2:
+        return 0.0
+    count = len(samples)
+    mean_frame = sum(frame for frame, _ in samples) / count
+    mean_rss = sum(rss for _, rss in samples) / count
+    variance = sum((frame - mean_frame) ** 2 for frame, _ in samples)
+    if variance == 0:
+        return 0.0
+    covariance = sum((frame - mean_frame) * (rss - mean_rss) for frame, rss in samples)
+    return covariance / variance * 1000
+
+
+parser = argparse.ArgumentParser(
+    description="Soak test of the slow movie player's memory use over thousands of frames"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-m", "--mp4", default="Test-2s.mp4"
+    ,help="movie to play over and over")
+parser.add_argument("-p", "--play_directory", default=None
+    ,help="play every mp4 in this directory instead of --mp4")
+parser.add_argument("-n", "--frames", type=int, default=5000
+    ,help="number of frames to show")
+parser.add_argument("-f", "--frames_increment", type=int, default=1
+    ,help="frame increment, as for the player")
+parser.add_argument("-e", "--sample_every", type=int, default=100
+    ,help="frames between RSS samples")
+parser.add_argument("-w", "--warm_up", type=int, default=200
+    ,help="frames shown before the growth is measured, while buffers and caches fill")
+parser.add_argument("-b", "--memory_budget", type=int, default=0
+    ,help="the player's --memory_budget in megabytes (0 turns it off)")
+parser.add_argument("--prefetch_depth", type=int, default=2
+    ,help="the player's --prefetch_depth")
+parser.add_argument("-S", "--screen_size", type=size_argument, default="1920x1080"
+    ,help="size of the (dummy) screen, WIDTHxHEIGHT")
+parser.add_argument("-o", "--output", default="soak_results.json"
+    ,help="file to write the JSON results to")
+
+args = parser.parse_args()
+
+# The player is set up from its own command line, without a delay between frames
+player_arguments = ["--delay", "0", "--frames_increment", str(args.frames_increment),
+                    "--prefetch_depth", str(args.prefetch_depth), "--memory_budget", str(args.memory_budget)]
+if args.play_directory:
+    player_arguments += ["--play_directory", args.play_directory]
+else:
+    player_arguments += ["--mp4", args.mp4]
+player_parser = build_parser()
+options = check_arguments(player_parser, player_parser.parse_args(player_arguments))
+
+rss_at_start = process_rss_bytes()
+player = Player(options)
+
+# A window of the screen size on the dummy driver stands in for the full screen display
+pygame.display.init()
+player.screen = pygame.display.set_mode(args.screen_size)
+player.screen_width, player.screen_height = args.screen_size
+player.presenter = Presenter(player.screen, background=BLACK_RGB)
+if player.memory_budget is not None:
+    player.plan_memory()
+
+frames = player.open_frame_source()
+samples = []
+shown = 0
+start = time.perf_counter()
+try:
+    while shown < args.frames:
+        frame = next(frames, None)
+        if frame is None:
+            break
+        player.presenter.present(frame.image, frame.position)
+        if player.memory_budget is not None:
+            player.check_memory(frames)
+        shown += 1
+        if shown % args.sample_every == 0 or shown == 1:
+            rss = process_rss_bytes()
+            samples.append((shown, rss))
+            print(f"{shown:>8,} frames {rss / MB:10,.1f} MB RSS")
+    elapsed = time.perf_counter() - start
+    converter_bytes = player.frame_converter.buffer_bytes() if player.frame_converter is not None else 0
+finally:
+    player.finish(frames)
+
+if not samples:
+    print("Error: No frames could be shown")
+    raise SystemExit(1)
+
+settled = [(frame, rss) for frame, rss in samples if frame >= args.warm_up] or samples[-1:]
+peak = max(rss for _, rss in samples)
+growth = settled[-1][1] - settled[0][1]
+slope = growth_per_thousand(settled)
+print(f"{shown:,} frames in {elapsed:,.1f} seconds ({elapsed / shown * 1000:,.1f} ms per frame)")
+print(f"RSS: {rss_at_start / MB:,.1f} MB at start, {settled[0][1] / MB:,.1f} MB after {settled[0][0]:,} frames, "
+      f"{samples[-1][1] / MB:,.1f} MB at the end, {peak / MB:,.1f} MB at the peak")
+print(f"Frame converter buffers: {converter_bytes / MB:,.1f} MB")
+print(f"Growth after the warm-up: {growth / MB:+,.1f} MB ({slope / MB:+,.3f} MB per 1,000 frames)")
+
+with open(args.output, "w") as file:
+    json.dump({
+        "arguments": vars(args),
+        "frames": shown,
+        "seconds": elapsed,
+        "rss_at_start": rss_at_start,
+        "peak_rss": peak,
+        "growth_after_warm_up": growth,
+        "growth_per_1000_frames": slope,
+        "converter_buffer_bytes": converter_bytes,
+        "samples": [{"frames": frame, "rss": rss} for frame, rss in samples],
+    }, file, indent=2)
+print(f"Results written to {args.output}")
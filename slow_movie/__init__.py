@@ -0,0 +1,5 @@
+# The slow movie player, as a package so its parts can be imported by
+# tests and benchmarks. Importing it does not load OpenCV or pygame;
+# only the modules that need them do.
+
+from .cli import main
@@ -0,0 +1,5 @@
+# python -m slow_movie
+
+from .cli import main
+
+main()
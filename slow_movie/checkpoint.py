@@ -0,0 +1,144 @@
+import json
+import os
+import time
+
+# Journal records appended before the journal is compacted into the snapshot
+COMPACT_RECORDS = 100
+
+# Version of the checkpoint format; checkpoints of other versions are ignored
+VERSION = 1
+
+
+def _write_atomically(filename, data):
+    ''' Replaces the file with data so a crash leaves either the old or the new file '''
+    temp_filename = filename + ".tmp"
+    with open(temp_filename, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, filename)
+
+
+class Checkpoint:
+    """
+    Remembers where playback was, so a restart after a power cut or crash
+    carries on from the same frame.
+
+    Each state is a small dictionary (the movie, frame, iteration and so
+    on). States are appended as JSON lines to a journal, at most one
+    every 'interval' seconds to limit wear on SD cards. After
+    COMPACT_RECORDS lines the latest state is written to the snapshot
+    file, atomically, and the journal is started again. A line cut short
+    by a crash is ignored when loading, so the previous state is used.
+    Every state is numbered, so a journal left over by a crash during
+    compaction can not replace the newer snapshot.
+
+    Example usage:
+        checkpoint = Checkpoint("smp.checkpoint", interval=60)
+        state = checkpoint.load()     # None if there is no checkpoint
+        checkpoint.record({"movie": "movie.mp4", "frame": 100})
+        checkpoint.close()            # writes the last state
+    """
+
+    def __init__(self, filename, interval=60):
+        self.filename = filename
+        self.journal_filename = filename + ".journal"
+        self.interval = interval
+        self.last_write = None
+        self.pending = None
+        self.journal = None
+        self.journal_records = 0
+        self.sequence = 0
+        self.writes = 0
+
+    def _newer(self, state, candidate):
+        ''' The newer of two states '''
+        if not isinstance(candidate, dict) or candidate.get("version") != VERSION:
+            return state
+        if state is None or candidate.get("sequence", 0) > state.get("sequence", 0):
+            return candidate
+        return state
+
+    def load(self):
+        ''' The last state recorded, or None if there is none '''
+        state = None
+        try:
+            with open(self.filename, "rb") as file:
+                state = self._newer(state, json.loads(file.read()))
+        except (OSError, ValueError):
+            pass
+
+        # the journal holds the states recorded since the snapshot was written
+        try:
+            with open(self.journal_filename, "rb") as file:
+                for line in file:
+                    if not line.endswith(b"\n"):
+                        # cut short by a crash
+                        break
+                    try:
+                        state = self._newer(state, json.loads(line))
+                    except ValueError:
+                        break
+                    self.journal_records += 1
+        except OSError:
+            pass
+
+        if state is not None:
+            # carry on numbering after the state loaded
+            self.sequence = state.get("sequence", 0)
+        return state
+
+    def record(self, state, force=False):
+        ''' Saves the state, or keeps it to save later if one was saved less than
+        'interval' seconds ago. Returns True if it was written '''
+        self.sequence += 1
+        self.pending = dict(state, version=VERSION, sequence=self.sequence, time=time.time())
+        now = time.monotonic()
+        if not force and self.last_write is not None and now - self.last_write < self.interval:
+            return False
+        self.last_write = now
+        self._write(self.pending)
+        self.pending = None
+        return True
+
+    def _write(self, state):
+        data = json.dumps(state, separators=(",", ":")).encode("utf-8")
+        if self.journal_records >= COMPACT_RECORDS:
+            self.compact(state)
+            return
+        if self.journal is None:
+            self.journal = open(self.journal_filename, "a+b")
+            # drop a line cut short by a crash, so new lines are not joined to it
+            self.journal.seek(0)
+            contents = self.journal.read()
+            if contents and not contents.endswith(b"\n"):
+                self.journal.truncate(contents.rfind(b"\n") + 1)
+        self.journal.write(data + b"\n")
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.journal_records += 1
+        self.writes += 1
+
+    def compact(self, state):
+        ''' Writes the state as the snapshot and empties the journal '''
+        _write_atomically(self.filename, json.dumps(state, indent=1).encode("utf-8"))
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        # the snapshot is newer than everything in the journal
+        with open(self.journal_filename, "wb"):
+            pass
+        self.journal_records = 0
+        self.writes += 1
+
+    def close(self):
+        ''' Writes the last state if it has not been written yet '''
+        if self.pending is not None:
+            self._write(self.pending)
+            self.pending = None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def __str__(self):
+        return f"Checkpoint '{self.filename}': {self.writes:,} writes"
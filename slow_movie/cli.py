@@ -0,0 +1,292 @@
+import argparse
+import os
+
+# Only light modules are imported here so --help and checking the arguments
+# do not have to load OpenCV, NumPy or pygame. The player and the commands
+# that need them import them when they run.
+from .frame_scheduler import parse_delay
+from .frame_server import FrameServerRunningError
+from .media_library import POLICIES
+from .metrics import Metrics
+
+ERROR_LOG = "error.log"  # Exceptions will be logged to this file
+
+# Same as video_index.DEFAULT_INDEX_FILE, which is not imported because it loads OpenCV
+DEFAULT_INDEX_FILE = "video_index.db"
+
+
+def delay_argument(text):
+    ''' argparse type for delays such as 10, 0.5, 250ms or 2m '''
+    try:
+        return parse_delay(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def size_argument(text):
+    ''' argparse type for sizes written as WIDTHxHEIGHT '''
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a size; use WIDTHxHEIGHT, for example 1280x720")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a size; width and height must be positive")
+    return width, height
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="slow-movie.py"
+        ,description="Plays movies frames much slower than normal \
+            play or can play random frames from random movies. \
+            Great for small displays mounted on a wall or \
+            sitting on a desk."
+        ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+        )
+
+    parser.add_argument("-d", "--delay", type=delay_argument, default=1
+        ,help="delay between frames in seconds, or with a unit: 250ms, 1.5s, 2m, 1h, 1d")
+    parser.add_argument("-f", "--frames_increment", type=int, default=1
+        ,help='frame increment (frame=1 means play every frame, frame=10 means play every 10 frames)')
+    parser.add_argument("-i", "--initial_frame", type=int, default=0
+        ,help="initial frame to display when playing the first movie in non-random mode")
+    parser.add_argument("-n", "--no_scale", action="store_false"
+        ,help="Do not scale movie frames to fit display")
+    parser.add_argument("--prefetch_depth", type=int, default=2
+        ,help="number of frames to decode and scale ahead of time in the background (0 turns prefetching off)")
+    parser.add_argument("--prefetch_memory", type=int, default=64
+        ,help="maximum memory in megabytes used by frames decoded ahead of time")
+    parser.add_argument("--memory_budget", type=int, default=0
+        ,help="megabytes the player may use for frames on top of what it needs to start; prefetching and fading are fitted into it, and near it the player does less and frees memory (0 turns this off)")
+    parser.add_argument("--index_file", type=str, default=DEFAULT_INDEX_FILE
+        ,help="file used to store the frame count, frame rate, size and codec of each movie")
+    parser.add_argument("--build_index", type=str, metavar="DIRECTORY"
+        ,help="add every mp4 in the directory to the index file using all processor cores, then exit")
+    parser.add_argument("--signatures", action="store_true"
+        ,help="with --build_index, also store a small signature of every --frames_increment frame, used by --skip_duplicates and --skip_black")
+    parser.add_argument("--skip_duplicates", type=int, default=0
+        ,help="skip frames that differ from the last frame shown by less than this (mean luma difference, 0-255; 0 turns this off). Needs --signatures in the index")
+    parser.add_argument("--skip_black", type=int, default=0
+        ,help="skip frames darker than this (mean luma, 0-255) or of a single color, and reject them as random frames (0 turns this off). Needs --signatures in the index")
+    parser.add_argument("--random_policy", choices=POLICIES, default="shuffle"
+        ,help="in random mode, 'shuffle' shows every movie once before repeating any, 'window' never repeats the last --no_repeat_window movies")
+    parser.add_argument("--no_repeat_window", type=int, default=1
+        ,help="with --random_policy window, how many of the most recent movies are not picked again")
+    parser.add_argument("--weight_by_length", action="store_true"
+        ,help="with --random_policy window, pick long movies more often so their frames are not under-sampled")
+    parser.add_argument("--library_refresh", type=int, default=60
+        ,help="in random mode, seconds between checks of the directory for added or removed movies")
+    parser.add_argument("--random_keyframes", action="store_true"
+        ,help="in random mode only pick key frames (or frames just after them) so each frame is quick to decode")
+    parser.add_argument("--keyframe_distance", type=int, default=0
+        ,help="with --random_keyframes, how many frames after a key frame a random frame may be")
+    parser.add_argument("--frame_cache", type=str, metavar="DIRECTORY"
+        ,help="keep frames already scaled to the screen in this folder so replaying a movie does not decode them again; random frames are not added")
+    parser.add_argument("--frame_cache_size", type=int, default=1024
+        ,help="maximum size of the frame cache in megabytes; the least recently shown frames are removed first")
+    parser.add_argument("--metrics_port", type=int, default=0
+        ,help="serve timing and memory metrics in Prometheus format at http://localhost:PORT/metrics (0 turns this off)")
+    parser.add_argument("--metrics_file", type=str, default=None
+        ,help="rewrite timing and memory metrics as JSON to this file every --metrics_interval seconds")
+    parser.add_argument("--metrics_interval", type=int, default=30
+        ,help="seconds between rewrites of --metrics_file")
+    parser.add_argument("--checkpoint", type=str, metavar="FILE"
+        ,help="remember the movie and frame being shown in this file and carry on from there when restarted")
+    parser.add_argument("--checkpoint_interval", type=delay_argument, default=60
+        ,help="least time between checkpoint writes, in seconds or with a unit (longer means less wear on SD cards)")
+    parser.add_argument("--crossfade", type=delay_argument, default=0
+        ,help="fade from one frame to the next over this many seconds, or with a unit: 500ms, 2s (0 turns fading off)")
+    parser.add_argument("--crossfade_movies_only", action="store_true"
+        ,help="with --crossfade, only fade when a new movie starts")
+    parser.add_argument("--crossfade_budget", type=float, default=0.25
+        ,help="with --crossfade, the share of the fade time the processor may spend blending; fewer steps are used to stay within it")
+    parser.add_argument("--double_buffer", action="store_true"
+        ,help="ask SDL for a hardware, double-buffered display; every frame is then a full screen flip")
+    parser.add_argument("--serve_frames", type=str, metavar="SOCKET"
+        ,help="decode and scale the frames once and send them to every display started with --frame_server SOCKET; no display is opened")
+    parser.add_argument("--serve_size", type=size_argument, default=None
+        ,help="with --serve_frames, WIDTHxHEIGHT to scale the served frames to (default: the size of the display)")
+    parser.add_argument("--client_queue", type=int, default=2
+        ,help="with --serve_frames, frames queued for each display before the oldest is dropped so a slow display does not hold up the others")
+    parser.add_argument("-x", "--debug", action="store_true"
+        ,help="Display debug messages")
+    parser.add_argument("-t", "--test_mode", action="store_true"
+        ,help="Test mode: delay between frames: 1 second; frame increment: 10; scale image; random off; play directory off; debug mode on")
+
+    # Note that if an argument is not specified in a mutually exclusive group,
+    # argparse will default the value to None.
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("-m", "--mp4"
+        ,help="file name of movie to play", type=str, nargs='?')
+    group.add_argument("-p", "--play_directory"
+        ,help="Play every mp4 in the specified directory in order and repeat forever", type=str, nargs='?')
+    group.add_argument("-r", "--random"
+        ,help="Display random frames from random files in a directory", type=str, nargs='?')
+    group.add_argument("-s", "--frame_store"
+        ,help="Play the frames extracted ahead of time into this file with --extract_frames", type=str, nargs='?')
+    group.add_argument("-c", "--frame_server"
+        ,help="Show the frames sent by the frame server started with --serve_frames on this socket; nothing is decoded", type=str, nargs='?')
+
+    parser.add_argument("--extract_frames", type=str, metavar="STORE_FILE"
+        ,help="extract every --frames_increment frame of --mp4 or every movie in --play_directory, scaled to --store_size, into this file using all processor cores, then exit")
+    parser.add_argument("--store_size", type=size_argument, default=None
+        ,help="WIDTHxHEIGHT to scale extracted frames to (default: the size of the display)")
+
+    return parser
+
+
+def check_arguments(parser, args):
+    ''' Applies test mode and checks that the files and folders given exist.
+    Stops the program with a message if the arguments can not be used. '''
+    # if one of the mutually exclusive options is not specified
+    # use parser.error to display an error message and stop the program
+    if not any([args.mp4, args.play_directory, args.random, args.frame_store, args.frame_server]):
+        parser.error("One of --mp4, --play_directory, --random, --frame_store or --frame_server must be specified with the name of a file or folder")
+
+    # If test mode was specified, override the parameters to the test mode settings
+    if args.test_mode:
+        args.delay = 1
+        args.frames_increment = 10
+        args.no_scale = True
+        args.random = None
+        args.play_directory = None
+        args.debug = True
+
+    # If the debug option was specified, show the values in use
+    if args.debug:
+        for name, value in vars(args).items():
+            print(f"{name}={value}")
+
+    # Check to make sure files or directories exist for the options specified.
+    # argparse returns None for mutually exclusive options not set, so use the
+    # argument value to see which option was specified and do error checking.
+
+    # if random mode, make sure the folder for the files is found
+    if args.random:
+        if not(os.path.exists(args.random)):
+            parser.error(f"Folder '{args.random}' for random videos can not be found!")
+
+    # if play directory mode make sure the folder for the files is found
+    if args.play_directory:
+        if not(os.path.exists(args.play_directory)):
+            parser.error(f"Folder '{args.play_directory}' for playing all files the directory can not be found!")
+
+    # if mp4 mode, make sure the file is found
+    if args.mp4:
+        if not(os.path.exists(args.mp4)):
+            parser.error(f"Error: {args.mp4} can not be found!")
+
+    # if frame store mode, make sure the store is found
+    if args.frame_store:
+        if not(os.path.exists(args.frame_store)):
+            parser.error(f"Frame store '{args.frame_store}' can not be found!")
+
+    # a frame server needs something to decode, and a display client decodes nothing
+    if args.serve_frames and args.frame_server:
+        parser.error("--serve_frames can not be used with --frame_server; start the server and each display separately")
+    if args.memory_budget < 0:
+        parser.error("--memory_budget can not be negative")
+    if args.client_queue < 1:
+        parser.error("--client_queue must be at least 1")
+
+    # a fade has to end before the next frame is due
+    if args.crossfade and args.crossfade >= args.delay:
+        parser.error(f"--crossfade ({args.crossfade:g} seconds) must be shorter than --delay ({args.delay:g} seconds)")
+    if not 0 < args.crossfade_budget <= 1:
+        parser.error("--crossfade_budget must be more than 0 and at most 1")
+
+    # weighting only makes sense when movies can be picked more than once per round
+    if args.weight_by_length and args.random_policy != "window":
+        parser.error("--weight_by_length can only be used with --random_policy window")
+
+    return args
+
+
+def run_build_index(parser, args):
+    ''' --build_index: adds every movie in a folder to the index, then exits '''
+    from .video_index import build_index
+
+    if not(os.path.isdir(args.build_index)):
+        parser.error(f"Folder '{args.build_index}' to index can not be found!")
+    signatures_increment = args.frames_increment if args.signatures else None
+    indexed, failed = build_index(args.build_index, args.index_file, keyframes=args.random_keyframes,
+                                  signatures_increment=signatures_increment)
+    print(f"{indexed:,} files indexed in '{args.index_file}', {failed:,} could not be read")
+    parser.exit(1 if failed else 0)
+
+
+def display_size():
+    ''' The (width, height) of the display, used when no size is given '''
+    import pygame
+
+    pygame.display.init()
+    display_info = pygame.display.Info()
+    size = (display_info.current_w, display_info.current_h)
+    pygame.display.quit()
+    return size
+
+
+def run_extract_frames(parser, args):
+    ''' --extract_frames: extracts frames into a frame store, then exits '''
+    from .frame_store import extract_frames
+
+    if args.play_directory:
+        movies_to_extract = [os.path.join(args.play_directory, f) for f in sorted(os.listdir(args.play_directory)) if f.endswith(".mp4")]
+    elif args.mp4:
+        movies_to_extract = [args.mp4]
+    else:
+        parser.error("--extract_frames needs --mp4 or --play_directory")
+    store_size = args.store_size
+    if store_size is None:
+        # use the size of the display the frames will be shown on
+        store_size = display_size()
+    failed = extract_frames(movies_to_extract, args.extract_frames, store_size, args.frames_increment)
+    print(f"Frames extracted into '{args.extract_frames}', {failed:,} could not be read")
+    parser.exit(1 if failed else 0)
+
+
+def main(argv=None):
+    ''' Runs the slow movie player with the command line arguments in argv
+    (sys.argv when None) '''
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    # Building the index is a separate command; it does not play anything
+    if args.build_index:
+        run_build_index(parser, args)
+
+    args = check_arguments(parser, args)
+
+    # Extracting frames into a store is a separate command; it does not play anything
+    if args.extract_frames:
+        run_extract_frames(parser, args)
+
+    # Timing and memory metrics; when neither output is asked for they cost next to nothing
+    metrics = Metrics(enabled=bool(args.metrics_port or args.metrics_file))
+    if args.metrics_port:
+        try:
+            metrics.serve(args.metrics_port)
+        except OSError as e:
+            parser.error(f"Can not serve metrics on port {args.metrics_port}: {e}")
+        print(f"Serving metrics at http://localhost:{args.metrics_port}/metrics")
+    if args.metrics_file:
+        metrics.write_periodically(args.metrics_file, args.metrics_interval)
+
+    # delete the error log if it exists
+    if os.path.exists(ERROR_LOG):
+        os.remove(ERROR_LOG)
+
+    # OpenCV, NumPy and pygame are only loaded now that there is something to play
+    from .player import Player
+
+    # A frame server only decodes; the displays connected to it show the frames
+    if args.serve_frames:
+        if args.serve_size is None:
+            args.serve_size = display_size()
+        try:
+            Player(args, metrics).serve(args.serve_frames, args.serve_size)
+        except FrameServerRunningError as e:
+            parser.error(e.strerror)
+        return
+
+    Player(args, metrics).run()
@@ -0,0 +1,99 @@
+import time
+
+import cv2
+import numpy as np
+import pygame
+
+# Steps of a crossfade; fewer are used when the CPU budget does not allow these
+MAX_STEPS = 30
+MIN_STEPS = 2
+
+# Weight of a new measurement of the cost of a step
+COST_SMOOTHING = 0.3
+
+
+class Crossfader:
+    """
+    Fades from the frame on the screen to the next one.
+
+    The two frames are kept in screen-sized uint8 buffers with the
+    letterbox bars drawn in, and each step of the fade is blended into a
+    third buffer with cv2.addWeighted. The buffers and the surface that
+    shows the blended buffer are allocated once, so a fade allocates no
+    memory per step.
+
+    The number of steps adapts to a CPU budget: the measured cost of a
+    step (blending and presenting it) is kept, and a fade of 'duration'
+    seconds uses as many steps as fit in cpu_budget of that time, between
+    MIN_STEPS and max_steps.
+
+    Example usage:
+        crossfader = Crossfader((1920, 1080), duration=2.0)
+        crossfader.set_frame(image, position)     # the frame on the screen
+        crossfader.fade(next_image, next_position, present, wait_until)
+    """
+
+    def __init__(self, screen_size, duration, cpu_budget=0.25, max_steps=MAX_STEPS, background=(0, 0, 0)):
+        self.screen_size = screen_size
+        self.duration = duration
+        self.cpu_budget = cpu_budget
+        self.max_steps = max_steps
+        self.background = background
+        width, height = screen_size
+        self.buffers = [np.zeros((height, width, 3), np.uint8) for _ in range(2)]
+        # surfaces sharing their pixels with the buffers, to draw frames into them
+        self.canvases = [pygame.image.frombuffer(buffer, screen_size, 'RGB') for buffer in self.buffers]
+        self.blend = np.zeros((height, width, 3), np.uint8)
+        self.blend_surface = pygame.image.frombuffer(self.blend, screen_size, 'RGB')
+        self.current = 0          # which buffer holds the frame on the screen
+        self.has_frame = False
+        self.step_cost = None     # seconds per step, once measured
+        self.fades = 0
+        self.steps_done = 0
+
+    def set_frame(self, image, position):
+        ''' Records the frame now on the screen, without fading '''
+        canvas = self.canvases[self.current]
+        canvas.fill(self.background)
+        canvas.blit(image, position)
+        self.has_frame = True
+
+    def plan_steps(self):
+        ''' The number of steps the next fade can afford '''
+        if self.step_cost is None:
+            # not measured yet; start low and adapt
+            return max(MIN_STEPS, self.max_steps // 4)
+        affordable = int(self.duration * self.cpu_budget / self.step_cost)
+        return max(MIN_STEPS, min(self.max_steps, affordable))
+
+    def fade(self, image, position, present, wait_until):
+        ''' Fades from the frame on the screen to image at position. present(surface)
+        puts a screen-sized surface on the display and wait_until(deadline) waits for
+        a time.monotonic() deadline. The last step is left to the caller, who shows
+        the new frame itself. Returns the number of blended steps shown. '''
+        previous = self.buffers[self.current]
+        self.current = 1 - self.current
+        self.set_frame(image, position)
+        current = self.buffers[self.current]
+
+        steps = self.plan_steps()
+        start = time.monotonic()
+        for step in range(1, steps):
+            wait_until(start + self.duration * step / steps)
+            begin = time.monotonic()
+            weight = step / steps
+            cv2.addWeighted(previous, 1.0 - weight, current, weight, 0.0, dst=self.blend)
+            present(self.blend_surface)
+            cost = time.monotonic() - begin
+            if self.step_cost is None:
+                self.step_cost = cost
+            else:
+                self.step_cost += COST_SMOOTHING * (cost - self.step_cost)
+        wait_until(start + self.duration)
+        self.fades += 1
+        self.steps_done += steps - 1
+        return steps - 1
+
+    def __str__(self):
+        cost = f"{self.step_cost * 1000:,.1f} ms" if self.step_cost is not None else "not measured"
+        return f"Crossfade: {self.fades:,} fades, {self.steps_done:,} steps, {cost} per step"
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import pygame
+
+# Fonts loaded so far, by (name, size). SysFont searches the system's fonts
+# (through fontconfig on Linux) every time it is called, so each font is
+# only looked up once.
+_fonts = {}
+
+
+def get_font(name, size):
+    ''' Returns the system font, loading it the first time it is asked for '''
+    font = _fonts.get((name, size))
+    if font is None:
+        font = _fonts[(name, size)] = pygame.font.SysFont(name, size)
+    return font
+
+
+class DebugOverlay:
+    """
+    Draws the debug text along the bottom of each frame: the file on the
+    left and the frame counter on the right.
+
+    The left text (file name and playing time) only changes when the
+    movie changes, so its rendering is cached and reused. Only the frame
+    counter is rendered again, and only when it is different from the
+    last one. draw() blits just the two text rectangles onto the frame,
+    which is then presented as a whole like any other frame.
+
+    Example usage:
+        overlay = DebugOverlay()
+        overlay.draw(image, "movie.mp4 (2.00 days)", "Frame 10 of 20")
+        print(overlay)   # how often the text had to be rendered
+    """
+
+    # Left texts kept rendered; a few so random mode can come back to a movie
+    CACHED_TEXTS = 16
+
+    def __init__(self, font_name="arial", font_size=20, text_color=(255, 255, 255)):
+        self.font = get_font(font_name, font_size)
+        self.text_color = text_color
+        self.static_texts = OrderedDict()
+        self.counter_text = None
+        self.counter_surface = None
+        self.renders = 0
+        self.draws = 0
+
+    def _render(self, text):
+        self.renders += 1
+        return self.font.render(text, True, self.text_color)
+
+    def _static(self, text):
+        ''' The cached rendering of text that rarely changes '''
+        surface = self.static_texts.get(text)
+        if surface is None:
+            surface = self.static_texts[text] = self._render(text)
+            if len(self.static_texts) > self.CACHED_TEXTS:
+                self.static_texts.popitem(last=False)
+        else:
+            self.static_texts.move_to_end(text)
+        return surface
+
+    def _counter(self, text):
+        ''' The rendering of the frame counter, redone only when it changes '''
+        if text != self.counter_text:
+            self.counter_surface = self._render(text)
+            self.counter_text = text
+        return self.counter_surface
+
+    def draw(self, image, left_text, right_text):
+        ''' Blits the texts onto the bottom corners of image '''
+        self.draws += 1
+        image_rect = image.get_rect()
+
+        left = self._static(left_text)
+        left_rect = left.get_rect(bottomleft=image_rect.bottomleft)
+
+        right = self._counter(right_text)
+        right_rect = right.get_rect(bottomright=image_rect.bottomright)
+
+        image.blit(left, left_rect)
+        image.blit(right, right_rect)
+
+    def __str__(self):
+        return f"Debug overlay: {self.draws:,} frames drawn, {self.renders:,} texts rendered"
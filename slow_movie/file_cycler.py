@@ -0,0 +1,236 @@
+import ctypes
+import ctypes.util
+import os
+import time
+from bisect import bisect_left
+
+# A directory modified this recently may still change within the same
+# modification time tick (one or two seconds on FAT and some network
+# file systems), so its listing is read again on the next call.
+MTIME_SETTLE_SECONDS = 2
+
+
+class _Inotify:
+    """
+    Minimal non-blocking inotify watch using libc through ctypes.
+    changed() reports whether anything was added, removed or renamed in
+    the watched directories since the last call.
+    """
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (0x00000100    # IN_CREATE
+                  | 0x00000200  # IN_DELETE
+                  | 0x00000040  # IN_MOVED_FROM
+                  | 0x00000080  # IN_MOVED_TO
+                  | 0x00000400  # IN_DELETE_SELF
+                  | 0x00000800) # IN_MOVE_SELF
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for '{directory}'")
+
+    def changed(self):
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            if not data:
+                return changed
+            changed = True
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class DirectoryListing:
+    """
+    Keeps the sorted list of files in a directory and only reads the
+    directory again when it has changed.
+
+    Changes are detected with inotify where it is available and otherwise
+    by polling the modification time of the directory (and of every sub
+    directory when scanning recursively).
+
+    You can optionally specify one file type or a list of file types,
+    and only those files will be listed. With recursive=True the files in
+    sub directories are listed too, as paths relative to the directory.
+
+    Example usage:
+        listing = DirectoryListing("/path/to/directory", filetype=["mp4", "mkv"])
+        files = listing.files()   # sorted list, or None if the directory does not exist
+        listing.close()
+    """
+
+    def __init__(self, directory, filetype=None, recursive=False, use_inotify=True):
+        self.directory = directory
+        self.recursive = recursive
+        if filetype is None:
+            self.suffixes = None
+        elif isinstance(filetype, str):
+            self.suffixes = ("." + filetype,)
+        else:
+            self.suffixes = tuple("." + t for t in filetype)
+        self.listing = None
+        # modification times of the directories read by the last scan
+        self.mtimes = {}
+        self.unsettled = True
+        # number of times the directory has been read, for testing
+        self.scans = 0
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = _Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+
+    def close(self):
+        ''' Releases the inotify watch; changes are polled for if files() is called again '''
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
+
+    def _wanted(self, name):
+        return self.suffixes is None or name.endswith(self.suffixes)
+
+    def _scan(self):
+        ''' Reads the directory. Returns the sorted file list, or None if the directory is gone '''
+        self.scans += 1
+        mtimes = {}
+        files = []
+        pending = [""]
+        unsettled = False
+        # (device, inode) of the directories read, so a directory reached again
+        # through a symbolic link, for example one making a loop, is read once
+        visited = set()
+        while pending:
+            relative = pending.pop()
+            path = os.path.join(self.directory, relative) if relative else self.directory
+            try:
+                info = os.stat(path)
+                if (info.st_dev, info.st_ino) in visited:
+                    continue
+                visited.add((info.st_dev, info.st_ino))
+                mtimes[path] = info.st_mtime
+                with os.scandir(path) as scan:
+                    for entry in scan:
+                        name = os.path.join(relative, entry.name) if relative else entry.name
+                        if self.recursive and entry.is_dir():
+                            pending.append(name)
+                        elif self._wanted(entry.name):
+                            files.append(name)
+            except (FileNotFoundError, NotADirectoryError):
+                if not relative:
+                    return None
+                # a sub directory was removed while scanning; look again next time
+                unsettled = True
+
+        if self.inotify is not None:
+            try:
+                for path in mtimes:
+                    self.inotify.watch(path)
+            except OSError:
+                # out of watches or an unsupported file system; poll instead
+                self.inotify.close()
+                self.inotify = None
+
+        now = time.time()
+        self.unsettled = unsettled or any(now - mtime < MTIME_SETTLE_SECONDS for mtime in mtimes.values())
+        self.mtimes = mtimes
+        files.sort()
+        return files
+
+    def _changed(self):
+        if self.listing is None or self.unsettled:
+            return True
+        if self.inotify is not None:
+            return self.inotify.changed()
+        try:
+            return any(os.stat(path).st_mtime != mtime for path, mtime in self.mtimes.items())
+        except OSError:
+            return True
+
+    def files(self):
+        ''' Returns the sorted list of files, or None if the directory does not exist '''
+        if not os.path.isdir(self.directory):
+            self.listing = None
+            return None
+        if self._changed():
+            if self.inotify is not None:
+                # drop pending events; the scan below sees their changes
+                self.inotify.changed()
+            self.listing = self._scan()
+        return self.listing
+
+
+def get_next_file(directory, filetype=None, recursive=False, use_inotify=True, start_after=None):
+    """
+    Module used to get the names of files in a directory.
+    File names are returned in sorted order and the code handles
+    the situation where files are added or deleted between calls.
+    After retrieving the last file in the directory, the next call
+    will got back to the top of the directory and return the first
+    file name.
+
+    You can optionally specify a specific file type, or a list of
+    file types, and only those files will be returned. With
+    recursive=True files in sub directories are returned as well,
+    as paths relative to the directory. With start_after, the first
+    call returns the file after that one, for carrying on where an
+    earlier run stopped.
+
+    The directory is only read again when it has changed (see
+    DirectoryListing), and the position in the listing is found with
+    a binary search, so each call is cheap even for huge directories.
+
+    Example usage:
+    	from file_cycler import get_next_file
+    	next_file_function = get_next_file("/path/to/directory")
+    	print(next_file_function()) # Get first file
+    	print(next_file_function()) # Get second file
+    	# ... and so on
+    	next_file_function.listing.close() # when done
+    """
+    last_file = start_after
+    listing = DirectoryListing(directory, filetype, recursive, use_inotify)
+
+    def next_file():
+        nonlocal last_file
+
+        # Get the current list of files; None if the directory does not exist
+        files = listing.files()
+
+        if not files:
+            # Return None if the directory is empty or does not exist
+            return None
+
+        # Find the last file returned
+        last_index = bisect_left(files, last_file) if last_file is not None else len(files)
+        if last_index < len(files) and files[last_index] == last_file:
+            # Calculate the index of the next file
+            next_index = (last_index + 1) % len(files)
+        else:
+            # The last file was deleted (or this is the first call): start at the top
+            next_index = 0
+
+        # Update last_file
+        last_file = files[next_index]
+        return last_file
+
+    next_file.listing = listing
+    return next_file
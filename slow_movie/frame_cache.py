@@ -0,0 +1,130 @@
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+
+# Each cached frame is a small header (width, height) followed by raw RGB pixels
+HEADER = struct.Struct("<II")
+CACHE_SUFFIX = ".rgb"
+
+
+def frame_key(video_filename, identity, frame_number, size, scale_mode):
+    ''' Builds the cache key of a frame: the file (path, size and mtime), the frame
+    number, the resolution the frame was scaled to and how it was scaled '''
+    width, height = size
+    text = f"{os.path.abspath(video_filename)}|{identity[0]}|{identity[1]}|{frame_number}|{width}x{height}|{scale_mode}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class FrameCache:
+    """
+    On-disk cache of frames that have already been scaled to the screen,
+    so replaying a movie does not decode and scale the same frames again.
+
+    Frames are stored as raw RGB, one file per frame, which is the cheapest
+    format to load back. The total size of the cache is kept under
+    max_bytes by removing the least recently used frames. Use is tracked
+    in memory and recorded on disk through the file's modification time,
+    so the order survives a restart.
+
+    Example usage:
+        cache = FrameCache("frame_cache", 1024 * 1024 * 1024)
+        key = frame_key("movie.mp4", identity, 100, (1280, 720), "fit")
+        pixels = cache.get(key)             # (bytearray, (width, height)) or None
+        if pixels is None:
+            cache.put(key, rgb_bytes, (1280, 720))
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # key -> size of the cached file, least recently used first
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def _load(self):
+        ''' Rebuilds the LRU order from the files already in the cache directory '''
+        found = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(CACHE_SUFFIX) and entry.is_file():
+                    stat = entry.stat()
+                    found.append((stat.st_mtime_ns, entry.name[:-len(CACHE_SUFFIX)], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _remove(self, key):
+        size = self.entries.pop(key, 0)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.entries and self.total_bytes > self.max_bytes:
+            oldest = next(iter(self.entries))
+            self._remove(oldest)
+
+    def get(self, key):
+        ''' Returns (pixels, (width, height)) for a cached frame, or None on a miss '''
+        if key not in self.entries:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                width, height = HEADER.unpack(file.read(HEADER.size))
+                pixels = bytearray(width * height * 3)
+                if file.readinto(pixels) != len(pixels):
+                    raise OSError(f"Truncated cache file '{path}'")
+            os.utime(path)
+        except (OSError, struct.error):
+            # the file was removed or damaged behind our back
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return pixels, (width, height)
+
+    def put(self, key, pixels, size):
+        ''' Stores the raw RGB pixels of a frame of the given (width, height) '''
+        width, height = size
+        entry_size = HEADER.size + len(pixels)
+        if entry_size > self.max_bytes:
+            return
+
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(HEADER.pack(width, height))
+                file.write(pixels)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Error: Could not write frame cache file '{path}': {e}")
+            return
+
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        self.entries[key] = entry_size
+        self.total_bytes += entry_size
+        self._evict()
+
+    def __str__(self):
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0
+        return (f"Frame cache: {self.hits:,} hits, {self.misses:,} misses ({hit_rate:.0f}% hit rate), "
+                f"{len(self.entries):,} frames, {self.total_bytes / (1024 * 1024):,.1f} MB")
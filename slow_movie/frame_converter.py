@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+import pygame
+
+
+def fit_geometry(image_width, image_height, screen_width, screen_height):
+    ''' Returns the (width, height) to scale an image to so it fits the screen, the
+    position to blit it at so it's centered, and True if it was fitted by width '''
+    # Compare the aspect ratio of the image and the screen
+    fit_by_width = image_width / image_height > screen_width / screen_height
+    if fit_by_width:
+        scale_factor = screen_width / image_width
+    else:
+        scale_factor = screen_height / image_height
+
+    scaled_width = max(1, int(image_width * scale_factor))
+    scaled_height = max(1, int(image_height * scale_factor))
+
+    # Determine where to place the scaled image so it's centered on the screen
+    centered_width_position = int((screen_width - scaled_width)/2)
+
+    return (scaled_width, scaled_height), (centered_width_position, 0), fit_by_width
+
+
+class FrameConverter:
+    """
+    Turns BGR frames from OpenCV into pygame surfaces ready to blit,
+    without allocating new arrays or copying pixels for every frame.
+
+    The fit geometry is computed once for each frame size. Frames are
+    resized with cv2.resize (INTER_AREA) and then converted to RGB, both
+    into preallocated NumPy buffers, and the surface returned shares the
+    RGB buffer's memory. Converting after resizing means the color
+    conversion only touches the pixels that will be shown. The resized
+    BGR frame is only needed until it has been converted, so one buffer
+    for it is shared by every frame.
+
+    Because surfaces share memory with the buffers, a surface stays valid
+    until 'buffers' more frames have been converted. Use enough buffers
+    to cover every frame that can be alive at once: the one on screen,
+    the ones queued by a prefetcher and the one being converted.
+
+    Example usage:
+        converter = FrameConverter((1280, 720), scale=True, buffers=4)
+        surface, position = converter.convert(bgr_frame)
+        screen.blit(surface, position)
+    """
+
+    def __init__(self, screen_size, scale=True, buffers=2):
+        self.screen_width, self.screen_height = screen_size
+        self.scale = scale
+        self.buffer_count = max(1, buffers)
+        self.frame_size = None
+        self.scaled_size = None
+        self.position = (0, 0)
+        self.fit_by_width = False
+        self.scaled_buffer = None
+        self.rgb_buffers = []
+        self.next_buffer = 0
+
+    def configure(self, frame_width, frame_height):
+        ''' Computes the geometry and allocates the buffers for a frame size.
+        Returns True if anything changed, False if the frame size is the same as before '''
+        if self.frame_size == (frame_width, frame_height):
+            return False
+
+        self.frame_size = (frame_width, frame_height)
+        if self.scale:
+            self.scaled_size, self.position, self.fit_by_width = fit_geometry(
+                frame_width, frame_height, self.screen_width, self.screen_height)
+        else:
+            self.scaled_size, self.position, self.fit_by_width = self.frame_size, (0, 0), False
+
+        width, height = self.scaled_size
+        self.rgb_buffers = [np.empty((height, width, 3), np.uint8) for _ in range(self.buffer_count)]
+        if self.scale and self.scaled_size != self.frame_size:
+            self.scaled_buffer = np.empty((height, width, 3), np.uint8)
+        else:
+            self.scaled_buffer = None
+        self.next_buffer = 0
+        return True
+
+    def convert(self, frame):
+        ''' Returns (surface, position) for a BGR frame. The surface shares memory
+        with one of the converter's buffers. '''
+        self.configure(frame.shape[1], frame.shape[0])
+
+        index = self.next_buffer
+        self.next_buffer = (index + 1) % self.buffer_count
+        rgb = self.rgb_buffers[index]
+
+        if self.scaled_buffer is not None:
+            scaled = self.scaled_buffer
+            cv2.resize(frame, self.scaled_size, dst=scaled, interpolation=cv2.INTER_AREA)
+        else:
+            scaled = frame
+        cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=rgb)
+
+        return pygame.image.frombuffer(rgb, self.scaled_size, 'RGB'), self.position
+
+    def buffer_bytes(self):
+        ''' Memory held by the converter's buffers for the current frame size '''
+        total = sum(buffer.nbytes for buffer in self.rgb_buffers)
+        if self.scaled_buffer is not None:
+            total += self.scaled_buffer.nbytes
+        return total
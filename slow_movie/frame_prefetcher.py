@@ -0,0 +1,115 @@
+import threading
+from collections import deque
+
+
+class FramePrefetcher:
+    """
+    Runs an iterator of display-ready frames in a background thread so
+    the next frames are decoded and scaled while the current frame is on
+    the screen.
+
+    At most 'depth' frames are queued, and no more than 'memory_cap' bytes
+    (as reported by the frame_bytes function) are held in the queue. One
+    frame is always allowed so playback can make progress even when a
+    single frame is larger than the cap. A depth of 0 turns prefetching
+    off and frames are produced on demand in the calling thread.
+
+    Exceptions raised by the iterator are re-raised in the consumer
+    after the frames queued before them have been returned.
+
+    Example usage:
+        frames = FramePrefetcher(frame_generator(), depth=2)
+        for frame in frames:
+            show(frame)
+        frames.close()
+    """
+
+    def __init__(self, frames, depth=2, memory_cap=64 * 1024 * 1024, frame_bytes=None):
+        self.frames = frames
+        self.depth = depth
+        self.memory_cap = memory_cap
+        self.frame_bytes = frame_bytes or (lambda frame: 0)
+        self.queue = deque()
+        self.queued_bytes = 0
+        self.error = None
+        self.done = False
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.thread = None
+        if depth > 0:
+            self.thread = threading.Thread(target=self._worker, name="frame-prefetch", daemon=True)
+            self.thread.start()
+
+    def _has_room(self, size):
+        if not self.queue:
+            return True
+        return len(self.queue) < self.depth and self.queued_bytes + size <= self.memory_cap
+
+    def _worker(self):
+        try:
+            for frame in self.frames:
+                size = self.frame_bytes(frame)
+                with self.condition:
+                    while not self.stopped and not self._has_room(size):
+                        self.condition.wait()
+                    if self.stopped:
+                        break
+                    self.queue.append((frame, size))
+                    self.queued_bytes += size
+                    self.condition.notify_all()
+        except BaseException as e:
+            # hand the exception to the consumer thread
+            with self.condition:
+                self.error = e
+        finally:
+            self._close_frames()
+            with self.condition:
+                self.done = True
+                self.condition.notify_all()
+
+    def _close_frames(self):
+        close = getattr(self.frames, "close", None)
+        if close is not None:
+            close()
+
+    def wait(self, timeout=None):
+        ''' Waits at most timeout seconds for a frame, or the end of the frames.
+        Returns True if next() will return straight away '''
+        if self.thread is None:
+            return True
+        with self.condition:
+            return self.condition.wait_for(lambda: self.queue or self.done, timeout)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.thread is None:
+            return next(self.frames)
+
+        with self.condition:
+            while not self.queue and not self.done:
+                self.condition.wait()
+            if self.queue:
+                frame, size = self.queue.popleft()
+                self.queued_bytes -= size
+                self.condition.notify_all()
+                return frame
+            if self.error is not None:
+                error, self.error = self.error, None
+                raise error
+            raise StopIteration
+
+    def close(self, timeout=5):
+        ''' Stops the background thread and drops any queued frames. Returns False
+        if the thread is still running after timeout seconds '''
+        if self.thread is None:
+            self._close_frames()
+            return True
+        with self.condition:
+            self.stopped = True
+            self.queue.clear()
+            self.queued_bytes = 0
+            self.condition.notify_all()
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
@@ -0,0 +1,83 @@
+import re
+import time
+
+# Seconds in each unit accepted by parse_delay
+UNITS = {
+    "ms": 0.001,
+    "s": 1,
+    "m": 60,
+    "h": 60 * 60,
+    "d": 24 * 60 * 60,
+}
+
+DELAY_PATTERN = re.compile(r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*(ms|s|m|h|d)?\s*$", re.IGNORECASE)
+
+
+def parse_delay(text):
+    ''' Converts a delay such as "2", "0.5", "250ms", "1.5s", "2m", "1h" or "1d" to
+    seconds. A number without a unit is in seconds. Raises ValueError if it can not. '''
+    match = DELAY_PATTERN.match(str(text))
+    if match is None:
+        raise ValueError(f"'{text}' is not a delay; use a number of seconds or a number followed by ms, s, m, h or d")
+    value, unit = match.groups()
+    return float(value) * UNITS[(unit or "s").lower()]
+
+
+class FrameScheduler:
+    """
+    Schedules frames against absolute deadlines on a monotonic clock.
+
+    Frame k is due at start + k * delay, where start is when the first
+    frame was shown. Because deadlines are absolute, the time spent
+    preparing a frame comes out of the wait instead of adding to it, and
+    the position stays where calculate_time_to_play() projects it even
+    after days of playback.
+
+    A frame shown more than max_lag seconds late (for example after the
+    system was suspended) moves the schedule forward instead of rushing
+    through the missed frames to catch up.
+
+    Example usage:
+        scheduler = FrameScheduler(parse_delay("250ms"))
+        while playing:
+            time.sleep(scheduler.time_until_next())
+            show_frame()
+            drift = scheduler.frame_shown()
+    """
+
+    def __init__(self, delay, max_lag=None, clock=time.monotonic):
+        self.delay = delay
+        self.max_lag = max(delay, 1.0) if max_lag is None else max_lag
+        self.clock = clock
+        self.start = None
+        self.frames = 0
+        # total seconds the schedule was moved forward because frames were too late
+        self.rescheduled = 0.0
+
+    def next_deadline(self):
+        ''' When the next frame is due, or None before the first frame '''
+        if self.start is None:
+            return None
+        return self.start + self.frames * self.delay
+
+    def time_until_next(self):
+        ''' Seconds until the next frame is due; 0 if it is due now or overdue '''
+        deadline = self.next_deadline()
+        if deadline is None:
+            return 0.0
+        return max(0.0, deadline - self.clock())
+
+    def frame_shown(self):
+        ''' Records that the next frame went on the screen. Returns how many
+        seconds after its deadline it was shown (the drift) '''
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+            drift = 0.0
+        else:
+            drift = now - self.next_deadline()
+            if drift > self.max_lag:
+                self.start += drift
+                self.rescheduled += drift
+        self.frames += 1
+        return drift
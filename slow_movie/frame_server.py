@@ -0,0 +1,316 @@
+import errno
+import json
+import os
+import socket
+import stat
+import struct
+import threading
+from collections import deque
+
+# Every frame sent is a header, then the frame's information as JSON, then its RGB pixels
+MAGIC = b"SMF1"
+HEADER = struct.Struct("!4sIII")   # magic, length of the information, image width, image height
+
+# Frames queued for a display client before the oldest is dropped
+QUEUE_FRAMES = 2
+
+# Seconds a display client may take to read a frame before it is disconnected
+SEND_TIMEOUT = 30
+
+# Longest wait, in seconds, between attempts to reconnect to the frame server
+RECONNECT_MAX_WAIT = 30
+
+
+class FrameServerRunningError(OSError):
+    """ Raised when another frame server is already serving on the socket """
+
+
+def remove_stale_socket(socket_path):
+    ''' Removes the socket file a server left behind when it did not shut down
+    cleanly. Raises FrameServerRunningError if a server still answers on it. '''
+    try:
+        if not stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            return
+    except FileNotFoundError:
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError as e:
+        if e.errno != errno.ECONNREFUSED:
+            # bind() reports what is wrong with the path
+            return
+        # nobody is listening; the file is left over
+        os.remove(socket_path)
+        return
+    finally:
+        probe.close()
+    raise FrameServerRunningError(errno.EADDRINUSE, f"A frame server is already running on '{socket_path}'")
+
+
+def encode_frame(info, pixels, size):
+    ''' The header and information of a frame, as bytes; the pixels are sent after them '''
+    data = json.dumps(info, separators=(",", ":")).encode("utf-8")
+    width, height = size
+    if len(pixels) != width * height * 3:
+        raise ValueError(f"{len(pixels):,} bytes of pixels for a {width}x{height} RGB image")
+    return HEADER.pack(MAGIC, len(data), width, height) + data
+
+
+class _DisplayClient:
+    """ One connected display: a queue of frames sent to it by its own thread """
+
+    def __init__(self, connection, queue_frames, disconnected):
+        self.connection = connection
+        self.queue = deque(maxlen=queue_frames)
+        self.ready = threading.Condition()
+        self.disconnected = disconnected
+        self.closed = False
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        # a display that stops reading is disconnected instead of holding frames forever
+        connection.settimeout(SEND_TIMEOUT)
+        self.thread = threading.Thread(target=self._run, name="frame-server-client", daemon=True)
+        self.thread.start()
+
+    def send(self, message):
+        ''' Queues a frame; when the display is behind, the oldest queued frame is dropped '''
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.frames_dropped += 1
+            self.queue.append(message)
+            self.ready.notify()
+
+    def _run(self):
+        try:
+            while True:
+                with self.ready:
+                    while not self.queue and not self.closed:
+                        self.ready.wait()
+                    if self.closed:
+                        return
+                    message = self.queue.popleft()
+                for part in message:
+                    self.connection.sendall(part)
+                self.frames_sent += 1
+        except OSError:
+            # the display went away or stopped reading
+            pass
+        finally:
+            self.close()
+            self.disconnected(self)
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+
+class FrameServer:
+    """
+    Sends frames, decoded and scaled once, to every display client
+    connected to a Unix domain socket.
+
+    Each frame is published once and the same bytes are queued for every
+    client, so a frame costs one decode however many screens show it.
+    Every client has its own sending thread and a queue of at most
+    queue_frames frames: a slow client drops its oldest frames instead of
+    holding up the decoder or the other clients, and a client that stops
+    reading for SEND_TIMEOUT seconds is disconnected. A client that
+    connects gets the latest frame straight away, so it does not stay
+    blank until the next frame is due.
+
+    Example usage:
+        server = FrameServer("/tmp/slow-movie.sock")
+        server.publish({"mp4_file": "movie.mp4"}, rgb_bytes, (1280, 720))
+        server.close()
+    """
+
+    def __init__(self, socket_path, queue_frames=QUEUE_FRAMES):
+        self.socket_path = socket_path
+        self.queue_frames = queue_frames
+        self.clients = []
+        self.latest = None
+        self.lock = threading.Lock()
+        self.frames_published = 0
+        self.connections = 0
+
+        # a socket file left behind by a server that did not shut down cleanly
+        remove_stale_socket(socket_path)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(socket_path)
+        self.listener.listen()
+        self.thread = threading.Thread(target=self._accept, name="frame-server", daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                # the server was closed
+                return
+            with self.lock:
+                client = _DisplayClient(connection, self.queue_frames, self._disconnected)
+                self.clients.append(client)
+                self.connections += 1
+                if self.latest is not None:
+                    client.send(self.latest)
+                count = len(self.clients)
+            print(f"Display connected to the frame server ({count} connected)")
+
+    def _disconnected(self, client):
+        with self.lock:
+            if client not in self.clients:
+                return
+            self.clients.remove(client)
+            count = len(self.clients)
+        print(f"Display disconnected from the frame server ({count} connected, "
+              f"{client.frames_sent:,} frames sent, {client.frames_dropped:,} dropped)")
+
+    def client_count(self):
+        with self.lock:
+            return len(self.clients)
+
+    def publish(self, info, pixels, size):
+        ''' Sends a frame to every connected client. 'pixels' are the RGB bytes of an
+        image of size (width, height); they are not copied, so they must not change. '''
+        message = (encode_frame(info, pixels, size), pixels)
+        with self.lock:
+            self.latest = message
+            for client in self.clients:
+                client.send(message)
+        self.frames_published += 1
+
+    def close(self):
+        ''' Disconnects every client and removes the socket file '''
+        # shutting the listener down wakes the accepting thread; closing it alone does not
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+    def __str__(self):
+        return (f"Frame server '{self.socket_path}': {self.frames_published:,} frames published, "
+                f"{self.connections:,} connections, {self.client_count()} connected")
+
+
+class FrameClient:
+    """
+    Receives the frames of a FrameServer, connecting again whenever the
+    connection is lost.
+
+    Frames are received into 'buffers' preallocated bytearrays used in
+    turn, so the pixels of a frame stay valid until that many more frames
+    have been received. Use enough buffers to cover every frame that can
+    be alive at once. When the server can not be reached, connecting is
+    tried again after a wait that doubles up to RECONNECT_MAX_WAIT.
+
+    Example usage:
+        client = FrameClient("/tmp/slow-movie.sock", buffers=4)
+        for info, pixels, size in client.frames():
+            show(info, pixels, size)
+        client.close()      # from another thread, to stop frames()
+    """
+
+    def __init__(self, socket_path, buffers=2):
+        self.socket_path = socket_path
+        self.buffers = [bytearray() for _ in range(max(1, buffers))]
+        self.next_buffer = 0
+        self.connection = None
+        self.closed = threading.Event()
+        self.frames_received = 0
+        self.reconnects = 0
+
+    def _connect(self):
+        ''' Connects to the server, waiting longer after each failure. Returns False if closed '''
+        wait = 0.5
+        while not self.closed.is_set():
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                connection.connect(self.socket_path)
+            except OSError as e:
+                connection.close()
+                print(f"Can not connect to the frame server '{self.socket_path}' ({e}); trying again in {wait:g} seconds")
+                self.closed.wait(wait)
+                wait = min(wait * 2, RECONNECT_MAX_WAIT)
+                continue
+            self.connection = connection
+            print(f"Connected to the frame server '{self.socket_path}'")
+            return True
+        return False
+
+    def _receive(self, view):
+        ''' Fills the memoryview from the connection; raises ConnectionError if it ends first '''
+        received = 0
+        while received < len(view):
+            count = self.connection.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("the frame server closed the connection")
+            received += count
+
+    def _receive_frame(self):
+        header = bytearray(HEADER.size)
+        self._receive(memoryview(header))
+        magic, info_length, width, height = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ConnectionError("the frame server sent something that is not a frame")
+        info = bytearray(info_length)
+        self._receive(memoryview(info))
+
+        # the pixels go straight into the next buffer, which only grows when frames get bigger
+        index = self.next_buffer
+        self.next_buffer = (index + 1) % len(self.buffers)
+        buffer = self.buffers[index]
+        size = width * height * 3
+        if len(buffer) < size:
+            # a new bytearray; frames still shown from the old one keep it alive
+            buffer = self.buffers[index] = bytearray(size)
+        pixels = memoryview(buffer)[:size]
+        self._receive(pixels)
+        return json.loads(info), pixels, (width, height)
+
+    def frames(self):
+        ''' Generator of (info, pixels, size) for each frame received, until close() is called '''
+        while self._connect():
+            try:
+                while True:
+                    frame = self._receive_frame()
+                    self.frames_received += 1
+                    yield frame
+            except (OSError, ValueError) as e:
+                if self.closed.is_set():
+                    return
+                self.reconnects += 1
+                print(f"Lost the connection to the frame server ({e}); reconnecting")
+            finally:
+                self.connection.close()
+                self.connection = None
+
+    def close(self):
+        ''' Stops frames(), even while it waits for a frame '''
+        self.closed.set()
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __str__(self):
+        return f"Frame client '{self.socket_path}': {self.frames_received:,} frames received, {self.reconnects:,} reconnects"
@@ -0,0 +1,169 @@
+import cv2
+import numpy as np
+
+from .video_decoder import DecoderSession
+
+# Each frame is reduced to SIGNATURE_SIZE x SIGNATURE_SIZE luma values
+SIGNATURE_SIZE = 8
+
+# Frames are first shrunk to this size one at a time, then reduced to
+# the signature size in batches
+THUMBNAIL_SIZE = SIGNATURE_SIZE * 4
+
+# Thumbnails reduced together
+BATCH_FRAMES = 256
+
+# A frame whose luma values spread less than this is blank (a single color)
+BLANK_SPREAD = 4.0
+
+# However alike the frames are, at least one in this many is shown
+MAX_SKIPPED_FRAMES = 60
+
+
+def _reduce(thumbnails):
+    ''' Averages a batch of THUMBNAIL_SIZE square thumbnails down to signatures '''
+    count = len(thumbnails)
+    block = THUMBNAIL_SIZE // SIGNATURE_SIZE
+    blocks = thumbnails.reshape(count, SIGNATURE_SIZE, block, SIGNATURE_SIZE, block)
+    return blocks.mean(axis=(2, 4)).round().astype(np.uint8).reshape(count, SIGNATURE_SIZE * SIGNATURE_SIZE)
+
+
+def compute_signatures(video_filename, increment=1):
+    ''' Reads every increment'th frame of the movie and returns their FrameSignatures,
+    or None if the movie can not be opened. Frames that can not be read get a
+    black signature. '''
+    decoder = DecoderSession(video_filename, reuse_frames=True)
+    if not decoder.is_open():
+        return None
+    try:
+        count = len(range(0, decoder.total_frames, increment))
+        luma = np.zeros((count, SIGNATURE_SIZE * SIGNATURE_SIZE), np.uint8)
+        thumbnails = np.zeros((BATCH_FRAMES, THUMBNAIL_SIZE, THUMBNAIL_SIZE), np.uint8)
+        gray = None
+        batch_start = 0
+        filled = 0
+        for i in range(count):
+            frame = decoder.read(i * increment)
+            if frame is not None:
+                if gray is None or gray.shape != frame.shape[:2]:
+                    gray = np.empty(frame.shape[:2], np.uint8)
+                cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+                cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), dst=thumbnails[filled], interpolation=cv2.INTER_AREA)
+            else:
+                thumbnails[filled] = 0
+            filled += 1
+            if filled == BATCH_FRAMES:
+                luma[batch_start:batch_start + filled] = _reduce(thumbnails)
+                batch_start += filled
+                filled = 0
+        if filled:
+            luma[batch_start:batch_start + filled] = _reduce(thumbnails[:filled])
+        return FrameSignatures(increment, luma)
+    finally:
+        decoder.release()
+
+
+class FrameSignatures:
+    """
+    Small signatures of a movie's frames, for skipping frames that would
+    not change what is on the screen without decoding them.
+
+    Every increment'th frame is reduced to an 8x8 grid of average luma
+    values (64 bytes). From those, with whole-movie NumPy operations:
+    the brightness of each frame, how much its values spread (a frame of
+    one color does not spread), and how different it is from the frame
+    before it.
+
+    Example usage:
+        signatures = compute_signatures("movie.mp4", increment=10)
+        skip = signatures.skip_mask(duplicate_threshold=2, black_level=16)
+        if not skip[frame_number // signatures.increment]:
+            show(frame_number)
+    """
+
+    def __init__(self, increment, luma):
+        self.increment = increment
+        self.luma = luma
+
+    def __len__(self):
+        return len(self.luma)
+
+    def to_bytes(self):
+        return self.luma.tobytes()
+
+    @classmethod
+    def from_bytes(cls, increment, data):
+        luma = np.frombuffer(data, np.uint8).reshape(-1, SIGNATURE_SIZE * SIGNATURE_SIZE)
+        return cls(increment, luma)
+
+    def resampled(self, increment, offset=0):
+        ''' The signatures of every increment'th frame starting at frame 'offset', or
+        None if those frames were not all sampled '''
+        if increment % self.increment or offset % self.increment:
+            return None
+        return FrameSignatures(increment, self.luma[offset // self.increment::increment // self.increment])
+
+    def brightness(self):
+        ''' Mean luma of each frame, 0 to 255 '''
+        return self.luma.mean(axis=1)
+
+    def spread(self):
+        ''' Standard deviation of the luma of each frame '''
+        return self.luma.std(axis=1)
+
+    def differences(self):
+        ''' Mean absolute luma difference of each frame from the one before it;
+        infinite for the first frame '''
+        steps = np.abs(np.diff(self.luma.astype(np.int16), axis=0)).mean(axis=1)
+        return np.concatenate(([np.inf], steps))
+
+    def blank(self, black_level):
+        ''' True for each frame that is darker than black_level or a single color '''
+        return (self.brightness() < black_level) | (self.spread() < BLANK_SPREAD)
+
+    def blank_near(self, frame_number, black_level):
+        ''' True if the sampled frame nearest to frame_number is blank '''
+        i = min(len(self.luma) - 1, int(round(frame_number / self.increment)))
+        luma = self.luma[i]
+        return bool(luma.mean() < black_level or luma.std() < BLANK_SPREAD)
+
+    def skip_mask(self, duplicate_threshold=0, black_level=0, max_skipped=MAX_SKIPPED_FRAMES):
+        ''' True for each frame that can be skipped: it differs from the last frame
+        shown by less than duplicate_threshold, or it is blank (see blank()). The first
+        frame, and at least one frame in max_skipped, are never skipped.
+
+        Frames are compared with the last frame shown, not the one before them, so a
+        slow fade or pan is shown once it has changed the picture enough. '''
+        count = len(self.luma)
+        skip = np.zeros(count, bool)
+        if count == 0 or max_skipped <= 1 or (duplicate_threshold <= 0 and black_level <= 0):
+            return skip
+        blank = self.blank(black_level) if black_level > 0 else skip
+        luma = self.luma.astype(np.int16)
+
+        # A frame that differs from the frame before it, when that one was shown, is
+        # shown too, so runs of such frames are settled at once. Only from the frames
+        # that might be skipped are the following frames compared with the last shown.
+        changed = ~blank
+        if duplicate_threshold > 0:
+            changed &= self.differences() >= duplicate_threshold
+        maybe_skipped = np.flatnonzero(~changed)
+
+        shown = 0         # the last frame shown
+        while True:
+            next_maybe = np.searchsorted(maybe_skipped, shown + 1)
+            if next_maybe == len(maybe_skipped):
+                break
+            shown = maybe_skipped[next_maybe] - 1
+
+            # compare the frames that can still be skipped with the last frame shown;
+            # the first one that is not alike, or the one after them, is shown next
+            start = shown + 1
+            end = min(count, shown + max_skipped)
+            alike = blank[start:end].copy()
+            if duplicate_threshold > 0:
+                alike |= np.abs(luma[start:end] - luma[shown]).mean(axis=1) < duplicate_threshold
+            different = np.flatnonzero(~alike)
+            shown = start + different[0] if len(different) else end
+            skip[start:shown] = True
+        return skip
@@ -0,0 +1,180 @@
+import json
+import mmap
+import os
+import struct
+from multiprocessing import Pool
+
+import cv2
+import numpy as np
+
+from .frame_converter import fit_geometry
+from .video_decoder import DecoderSession
+from .video_index import probe_video
+
+MAGIC = b"SMPFRMS1"
+
+# magic, width, height, frame count, data offset, index offset, index length
+HEADER = struct.Struct("<8sIIQQQQ")
+
+# Frame data starts on a page boundary so every frame can be mapped directly
+DATA_ALIGNMENT = 4096
+
+# Frames decoded by one worker task; large enough to grab forward between them
+CHUNK_FRAMES = 50
+
+
+def _extract_chunk(task):
+    ''' Pool worker: decodes, scales and writes one run of frames of one movie.
+    Returns (movie path, frames written, frames that could not be read) '''
+    store_filename, video_filename, first_index, frame_numbers, size, data_offset = task
+    width, height = size
+    stride = width * height * 3
+
+    decoder = DecoderSession(video_filename, reuse_frames=True)
+    canvas = np.zeros((height, width, 3), np.uint8)
+    failed = 0
+    fd = os.open(store_filename, os.O_WRONLY)
+    try:
+        geometry = None
+        for i, frame_number in enumerate(frame_numbers):
+            frame = decoder.read(frame_number) if decoder.is_open() else None
+            if frame is None:
+                # leave the frame black
+                failed += 1
+                continue
+            if geometry is None:
+                scaled_size, position, _ = fit_geometry(frame.shape[1], frame.shape[0], width, height)
+                x, y = position
+                target = canvas[y:y + scaled_size[1], x:x + scaled_size[0]]
+                scaled = np.empty_like(target)
+                scaled_rgb = np.empty_like(target)
+                geometry = scaled_size
+            cv2.resize(frame, geometry, dst=scaled, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(scaled, cv2.COLOR_BGR2RGB, dst=scaled_rgb)
+            # the letterbox bars around the target stay black
+            target[...] = scaled_rgb
+            os.pwrite(fd, canvas.data, data_offset + (first_index + i) * stride)
+    finally:
+        os.close(fd)
+        decoder.release()
+    return video_filename, len(frame_numbers) - failed, failed
+
+
+def extract_frames(video_filenames, store_filename, size, frames_increment=1, processes=None):
+    ''' Extracts every frames_increment'th frame of the movies, scaled to size
+    (width, height), into a frame store file using a process pool across all
+    cores. Returns the number of frames that could not be read. '''
+    width, height = size
+    stride = width * height * 3
+
+    movies = []
+    frame_count = 0
+    for video_filename in video_filenames:
+        probed = probe_video(video_filename)
+        if probed is None:
+            print(f"Error: Could not open video file '{video_filename}'.")
+            continue
+        metadata = probed[1]
+        count = len(range(0, metadata["frame_count"], frames_increment))
+        movies.append({
+            "path": video_filename,
+            "total_frames": metadata["frame_count"],
+            "fps": metadata["fps"],
+            "increment": frames_increment,
+            "frames": count,
+            "start": frame_count,
+        })
+        frame_count += count
+
+    data_offset = DATA_ALIGNMENT
+    index_offset = data_offset + frame_count * stride
+    print(f"Extracting {frame_count:,} frames of {width}x{height} from {len(movies):,} movies "
+          f"into '{store_filename}' ({index_offset / (1024 * 1024 * 1024):,.1f} GB)")
+
+    # build the store under a temporary name so a half written store is never played
+    temp_filename = store_filename + ".tmp"
+    with open(temp_filename, "wb") as file:
+        file.truncate(index_offset)
+
+    tasks = []
+    for movie in movies:
+        numbers = list(range(0, movie["total_frames"], frames_increment))
+        for chunk_start in range(0, len(numbers), CHUNK_FRAMES):
+            tasks.append((temp_filename, movie["path"], movie["start"] + chunk_start,
+                          numbers[chunk_start:chunk_start + CHUNK_FRAMES], (width, height), data_offset))
+
+    failed = 0
+    written = 0
+    with Pool(processes or os.cpu_count()) as pool:
+        for video_filename, chunk_written, chunk_failed in pool.imap_unordered(_extract_chunk, tasks):
+            written += chunk_written
+            failed += chunk_failed
+            print(f"{written + failed:,} of {frame_count:,} frames extracted ({video_filename})")
+
+    index = json.dumps({"movies": movies}).encode("utf-8")
+    with open(temp_filename, "r+b") as file:
+        file.seek(index_offset)
+        file.write(index)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, width, height, frame_count, data_offset, index_offset, len(index)))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_filename, store_filename)
+    return failed
+
+
+class FrameStore:
+    """
+    Frames extracted ahead of time by extract_frames(), read straight from
+    a memory-mapped file so playing them needs no decoding at all.
+
+    The file is a header, then every frame as a fixed-size RGB array of
+    width x height pixels, then a JSON index of the movies the frames came
+    from. frame() returns a view into the mapping, so no pixels are copied.
+    The mapping is read-only: nothing may be drawn on a frame, so its pages
+    stay shared with the file cache instead of becoming private memory of
+    the process. Copy a frame to draw on it (see Player.drawable).
+
+    Example usage:
+        store = FrameStore("movies.frames")
+        surface = pygame.image.frombuffer(store.frame(0), store.size, 'RGB')
+    """
+
+    def __init__(self, store_filename):
+        self.store_filename = store_filename
+        self.file = open(store_filename, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"Frame store '{store_filename}' is empty")
+        magic, width, height, frame_count, data_offset, index_offset, index_length = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"'{store_filename}' is not a frame store")
+        self.size = (width, height)
+        self.stride = width * height * 3
+        self.frame_count = frame_count
+        self.data_offset = data_offset
+        self.movies = json.loads(self.map[index_offset:index_offset + index_length])["movies"]
+        self.view = memoryview(self.map)
+
+    def __len__(self):
+        return self.frame_count
+
+    def frame(self, index):
+        ''' The RGB pixels of a stored frame, as a view into the mapped file '''
+        start = self.data_offset + index * self.stride
+        return self.view[start:start + self.stride]
+
+    def close(self):
+        try:
+            view = getattr(self, "view", None)
+            if view is not None:
+                view.release()
+            self.map.close()
+        except BufferError:
+            # a surface still uses a frame; the mapping goes when it does
+            pass
+        self.file.close()
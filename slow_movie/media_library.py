@@ -0,0 +1,188 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from .file_cycler import DirectoryListing
+
+SHUFFLE_POLICY = "shuffle"
+WINDOW_POLICY = "window"
+POLICIES = (SHUFFLE_POLICY, WINDOW_POLICY)
+
+
+def build_alias_table(weights):
+    ''' Builds Vose's alias tables so a weighted random pick takes constant time '''
+    count = len(weights)
+    total = sum(weights)
+    probability = [weight * count / total for weight in weights]
+    alias = [0] * count
+    small = [i for i, p in enumerate(probability) if p < 1]
+    large = [i for i, p in enumerate(probability) if p >= 1]
+    while small and large:
+        less = small.pop()
+        more = large.pop()
+        alias[less] = more
+        probability[more] -= 1 - probability[less]
+        if probability[more] < 1:
+            small.append(more)
+        else:
+            large.append(more)
+    # whatever is left over is 1 up to rounding errors
+    for i in small + large:
+        probability[i] = 1
+    return probability, alias
+
+
+class MediaLibrary:
+    """
+    In-memory list of the movies in a directory for picking random movies.
+
+    The directory is read once and then only checked for changes every
+    refresh_seconds, so picking a movie does not touch the file system.
+    Two policies are available:
+
+      shuffle  every movie is picked once, in random order, before any
+               movie is picked again (a shuffle bag). A new round never
+               starts with the movie that ended the previous one.
+      window   movies are picked at random, but never one of the last
+               no_repeat_window movies picked. If a weight function is
+               given, movies are picked in proportion to their weight
+               (for example their length) so long movies are not
+               under-sampled.
+
+    The files and their weights are changed together under a lock, so
+    update_weights() can run in another thread than choose().
+
+    Example usage:
+        library = MediaLibrary("/videos", "mp4", policy="shuffle")
+        print(library.choose())   # full path of a movie, or None if there are none
+        library.close()
+    """
+
+    def __init__(self, directory, filetype="mp4", policy=SHUFFLE_POLICY, no_repeat_window=1,
+                 weight=None, refresh_seconds=60):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown random policy '{policy}', use one of {', '.join(POLICIES)}")
+        self.directory = directory
+        self.policy = policy
+        self.no_repeat_window = no_repeat_window
+        self.weight = weight
+        self.refresh_seconds = refresh_seconds
+        self.listing = DirectoryListing(directory, filetype)
+        self.files = []
+        self.present = set()
+        self.last_refresh = None
+        # shuffle policy: files still to be picked this round, picked from the end
+        self.bag = []
+        # window policy: the most recently picked files
+        self.recent = deque()
+        self.alias_table = None
+        self.last_pick = None
+        # held while the files, the bag or the alias table change or are read
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        self.refresh()
+        return len(self.files)
+
+    def refresh(self, force=False):
+        ''' Picks up added and removed files if refresh_seconds have passed '''
+        with self.lock:
+            self._refresh(force)
+
+    def _refresh(self, force):
+        now = time.monotonic()
+        if not force and self.last_refresh is not None and now - self.last_refresh < self.refresh_seconds:
+            return
+        self.last_refresh = now
+
+        files = self.listing.files() or []
+        if files is self.files:
+            return
+
+        added = [f for f in files if f not in self.present]
+        self.files = files
+        self.present = set(files)
+
+        # new files go into the current round at random places; removed
+        # files are skipped when they come up
+        for name in added:
+            self.bag.append(name)
+            swap = random.randrange(len(self.bag))
+            self.bag[-1], self.bag[swap] = self.bag[swap], self.bag[-1]
+
+        if self.weight is not None and files:
+            self.alias_table = build_alias_table(self._weights(files))
+
+    def update_weights(self):
+        ''' Weighs the files again, for example after more of their lengths became known '''
+        files = self.files
+        if self.weight is None or not files:
+            return
+        # weighing can take a while, so choose() is not held up by it
+        alias_table = build_alias_table(self._weights(files))
+        with self.lock:
+            # if the files changed meanwhile, refresh() has weighed the new list
+            if self.files is files:
+                self.alias_table = alias_table
+
+    def _weights(self, files):
+        ''' Weights for the files; unknown weights get the average of the known ones '''
+        weights = [self.weight(os.path.join(self.directory, f)) for f in files]
+        known = [w for w in weights if w]
+        default = sum(known) / len(known) if known else 1
+        return [w if w else default for w in weights]
+
+    def close(self):
+        ''' Stops watching the directory for changes '''
+        with self.lock:
+            self.listing.close()
+
+    def _choose_shuffle(self):
+        while True:
+            if not self.bag:
+                self.bag = list(self.files)
+                random.shuffle(self.bag)
+                # don't start the new round with the movie just shown
+                if len(self.bag) > 1 and self.bag[-1] == self.last_pick:
+                    self.bag[0], self.bag[-1] = self.bag[-1], self.bag[0]
+            name = self.bag.pop()
+            if name in self.present:
+                return name
+
+    def _random_index(self):
+        if self.alias_table is None:
+            return random.randrange(len(self.files))
+        probability, alias = self.alias_table
+        i = random.randrange(len(probability))
+        return i if random.random() < probability[i] else alias[i]
+
+    def _choose_window(self):
+        window = min(self.no_repeat_window, len(self.files) - 1)
+        while len(self.recent) > window:
+            self.recent.popleft()
+        recent = set(self.recent)
+        # with at least one allowed file this ends quickly; the bound covers bad luck
+        for _ in range(100):
+            name = self.files[self._random_index()]
+            if name not in recent:
+                break
+        else:
+            name = random.choice([f for f in self.files if f not in recent])
+        if window > 0:
+            self.recent.append(name)
+        return name
+
+    def choose(self):
+        ''' Returns the full path of the next random movie, or None if there are none '''
+        with self.lock:
+            self._refresh(False)
+            if not self.files:
+                return None
+            if self.policy == SHUFFLE_POLICY:
+                name = self._choose_shuffle()
+            else:
+                name = self._choose_window()
+            self.last_pick = name
+        return os.path.join(self.directory, name)
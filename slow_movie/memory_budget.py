@@ -0,0 +1,112 @@
+import ctypes
+import gc
+import time
+
+from .metrics import process_rss_bytes
+
+# Share of the budget the frame buffers planned before playing may take; the
+# rest is left for the decoder's frame, which can be larger than the screen
+PLANNED_SHARE = 0.5
+
+# Above this share of the budget the player does less work and trims the heap...
+HIGH_WATER = 0.9
+
+# ...until memory use is back below this share
+LOW_WATER = 0.75
+
+# Least seconds between two heap trims while over the budget
+TRIM_INTERVAL = 10
+
+
+def _malloc_trim():
+    ''' glibc's malloc_trim(), which hands freed heap memory back to the system, or
+    None where the C library does not have it '''
+    try:
+        return ctypes.CDLL(None).malloc_trim
+    except (OSError, AttributeError):
+        return None
+
+
+class MemoryBudget:
+    """
+    Keeps the memory the player uses for frames under a budget, for
+    small devices playing 4K or high bitrate movies for weeks.
+
+    The budget is counted from the resident memory of the process when
+    it is made, once OpenCV, NumPy and pygame are loaded, so it covers
+    what playing adds: the decoder's frame, the converter's buffers, the
+    prefetch queue and the crossfade buffers.
+
+    Before playing, each of those asks reserve() for its memory and is
+    turned down or off if it does not fit; together they may take
+    PLANNED_SHARE of the budget. While playing, under_pressure() compares
+    resident memory with the budget. Above HIGH_WATER of it the heap is
+    trimmed (garbage collected, and freed memory handed back to the
+    system so it does not stay fragmented) and the player should do less
+    until memory is back below LOW_WATER.
+
+    Example usage:
+        budget = MemoryBudget(128 * 1024 * 1024)
+        if not budget.reserve("crossfade", 3 * frame_bytes):
+            crossfade = 0
+        if budget.under_pressure():
+            frames.depth = 1
+    """
+
+    def __init__(self, limit_bytes, rss=process_rss_bytes):
+        self.limit = limit_bytes
+        self.rss = rss
+        self.baseline = rss()
+        self.reserved = {}
+        self.pressure = False
+        self.pressure_count = 0   # times memory went over HIGH_WATER
+        self.peak = 0
+        self.last_used = 0
+        self.trims = 0
+        self.last_trim = None
+        self.malloc_trim = _malloc_trim()
+
+    def available(self):
+        ''' Bytes that can still be reserved '''
+        return int(self.limit * PLANNED_SHARE) - sum(self.reserved.values())
+
+    def reserve(self, name, size):
+        ''' Sets size bytes aside for name. Returns False, reserving nothing, if they do not fit '''
+        if size > self.available():
+            return False
+        self.reserved[name] = self.reserved.get(name, 0) + size
+        return True
+
+    def used(self):
+        ''' Resident memory above what the process used when the budget was made '''
+        used = max(0, self.rss() - self.baseline)
+        self.peak = max(self.peak, used)
+        self.last_used = used
+        return used
+
+    def trim(self):
+        ''' Frees unreachable objects and hands free heap memory back to the system '''
+        gc.collect()
+        if self.malloc_trim is not None:
+            self.malloc_trim(0)
+        self.trims += 1
+        self.last_trim = time.monotonic()
+
+    def under_pressure(self):
+        ''' True while memory use is near the budget. Cheap enough to call for every frame '''
+        used = self.used()
+        if self.pressure:
+            if used < self.limit * LOW_WATER:
+                self.pressure = False
+        elif used > self.limit * HIGH_WATER:
+            self.pressure = True
+            self.pressure_count += 1
+        if self.pressure and (self.last_trim is None or time.monotonic() - self.last_trim >= TRIM_INTERVAL):
+            self.trim()
+        return self.pressure
+
+    def __str__(self):
+        mb = 1024 * 1024
+        return (f"Memory budget: {self.limit / mb:,.0f} MB, {sum(self.reserved.values()) / mb:,.1f} MB reserved for frames, "
+                f"peak {self.peak / mb:,.1f} MB above the {self.baseline / mb:,.0f} MB used at start, "
+                f"over {HIGH_WATER:.0%} {self.pressure_count:,} times, {self.trims:,} heap trims")
@@ -0,0 +1,247 @@
+import json
+import os
+import resource
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds, in seconds, of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Number of recent measurements kept per stage for the rolling percentiles
+WINDOW = 1000
+
+PREFIX = "slow_movie_"
+
+# Used as the start of the process where the system does not say when it started
+_IMPORTED = time.monotonic()
+
+
+def process_rss_bytes():
+    ''' Resident memory of this process; the peak if the current value is not available '''
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def process_age_seconds():
+    ''' Seconds since this process was started, including the time Python took to
+    start; since this module was imported if the system does not say '''
+    try:
+        with open("/proc/self/stat") as file:
+            # the command name can contain spaces, so count the fields after it
+            fields = file.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as file:
+            uptime = float(file.read().split()[0])
+        # field 22 of stat is the start time in clock ticks after boot
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _IMPORTED
+
+
+class _Histogram:
+    """ Cumulative bucket counts (for Prometheus) plus a window of recent values """
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+
+    def percentile(self, fraction):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.monotonic() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Per-stage timing, counters and gauges for a running player.
+
+    Latencies are kept as histograms with fixed buckets and as a rolling
+    window of the last WINDOW values for percentiles. The numbers can be
+    served as Prometheus text on localhost and/or written to a JSON file
+    every few seconds, so a fleet of displays can be monitored.
+
+    When disabled every method returns straight away, so instrumented
+    code costs next to nothing.
+
+    Example usage:
+        metrics = Metrics(enabled=True)
+        metrics.serve(9100)
+        with metrics.timer("decode"):
+            frame = decoder.read(frame_number)
+        metrics.increment("frames_shown")
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.time()
+        self.server = None
+        self.writer = None
+        self.stopping = threading.Event()
+
+    def timer(self, stage):
+        ''' Context manager that records how long its block took as 'stage' '''
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = _Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, counter, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def set_gauge(self, gauge, value):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[gauge] = value
+
+    def snapshot(self):
+        ''' All current values as a dictionary '''
+        self.set_gauge("process_rss_bytes", process_rss_bytes())
+        with self.lock:
+            return {
+                "time": time.time(),
+                "uptime_seconds": time.time() - self.started,
+                "stages": {
+                    stage: {
+                        "count": h.count,
+                        "total_seconds": h.total,
+                        "mean_ms": h.total / h.count * 1000 if h.count else 0.0,
+                        "p50_ms": h.percentile(0.5) * 1000,
+                        "p95_ms": h.percentile(0.95) * 1000,
+                        "max_recent_ms": max(h.recent) * 1000 if h.recent else 0.0,
+                    }
+                    for stage, h in self.histograms.items()
+                },
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def prometheus_text(self):
+        ''' All current values in the Prometheus text exposition format '''
+        self.set_gauge("process_rss_bytes", process_rss_bytes())
+        lines = []
+        with self.lock:
+            name = PREFIX + "stage_seconds"
+            lines.append(f"# HELP {name} Time spent in each stage of showing a frame.")
+            lines.append(f"# TYPE {name} histogram")
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, h.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {h.total}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {h.count}')
+            for counter, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE {PREFIX}{counter}_total counter")
+                lines.append(f"{PREFIX}{counter}_total {value}")
+            for gauge, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {PREFIX}{gauge} gauge")
+                lines.append(f"{PREFIX}{gauge} {value}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        ''' Serves /metrics in Prometheus text format from a background thread '''
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # keep scrapes out of the player's output
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+
+    def write_file(self, filename):
+        ''' Writes the snapshot as JSON, replacing the file atomically '''
+        temp_filename = filename + ".tmp"
+        with open(temp_filename, "w") as file:
+            json.dump(self.snapshot(), file, indent=2)
+        os.replace(temp_filename, filename)
+
+    def write_periodically(self, filename, interval):
+        ''' Rewrites the JSON stats file every 'interval' seconds from a background thread '''
+        def writer():
+            while not self.stopping.wait(interval):
+                try:
+                    self.write_file(filename)
+                except OSError as e:
+                    print(f"Error: Could not write metrics file '{filename}': {e}")
+
+        self.writer = threading.Thread(target=writer, name="metrics-file", daemon=True)
+        self.writer.start()
+
+    def close(self):
+        self.stopping.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
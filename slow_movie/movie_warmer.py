@@ -0,0 +1,71 @@
+import threading
+
+
+class MovieWarmer:
+    """
+    Gets the next movie ready in a background thread while the current
+    movie is still playing, so moving on to it costs no more than showing
+    any other frame.
+
+    'warm' is called in the background thread and returns whatever is
+    needed to start the next movie, for example the open decoder and its
+    first decoded frame. take() waits for that result and returns it.
+    Results that are never taken are passed to 'discard' when the warmer
+    is closed, so open files are not leaked.
+
+    Exceptions raised by 'warm' are re-raised by take().
+
+    Example usage:
+        warmer = MovieWarmer(open_next_movie, discard=lambda movie: movie.release())
+        warmer.start()            # near the end of the current movie
+        ...
+        movie = warmer.take()     # when the current movie has ended
+        warmer.close()
+    """
+
+    def __init__(self, warm, discard=None):
+        self.warm = warm
+        self.discard = discard
+        self.thread = None
+        self.result = None
+        self.error = None
+
+    def _worker(self):
+        try:
+            self.result = self.warm()
+        except BaseException as e:
+            # hand the exception to the thread that takes the result
+            self.error = e
+
+    def start(self):
+        ''' Starts warming the next movie, unless that has already been started '''
+        if self.thread is None:
+            self.result = None
+            self.error = None
+            self.thread = threading.Thread(target=self._worker, name="movie-warmer", daemon=True)
+            self.thread.start()
+
+    def warming(self):
+        ''' True if start() was called and the result has not been taken yet '''
+        return self.thread is not None
+
+    def take(self):
+        ''' Waits for the warmed movie and returns it '''
+        if self.thread is None:
+            return None
+        self.thread.join()
+        self.thread = None
+        result, self.result = self.result, None
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+        return result
+
+    def close(self):
+        ''' Waits for any warming in progress and discards its result '''
+        try:
+            result = self.take()
+        except Exception:
+            return
+        if result is not None and self.discard is not None:
+            self.discard(result)
@@ -0,0 +1,1121 @@
+import math
+import os
+import random
+import threading
+import time
+import traceback
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import cv2
+import pygame
+
+from .checkpoint import Checkpoint
+from .cli import ERROR_LOG
+from .crossfade import Crossfader
+from .debug_overlay import DebugOverlay, get_font
+from .file_cycler import get_next_file
+from .frame_cache import FrameCache, frame_key
+from .frame_converter import FrameConverter, fit_geometry
+from .frame_prefetcher import FramePrefetcher
+from .frame_scheduler import FrameScheduler
+from .frame_server import FrameClient, FrameServer
+from .frame_store import FrameStore
+from .media_library import MediaLibrary
+from .memory_budget import PLANNED_SHARE, MemoryBudget
+from .metrics import Metrics, process_age_seconds
+from .movie_warmer import MovieWarmer
+from .presenter import Presenter
+from .video_decoder import DecodeStats, DecoderSession, file_identity
+from .video_index import VideoIndex
+
+BLACK_RGB = (0, 0, 0)
+RED_RGB   = (255, 0, 0)
+
+# Random frames picked again at most this many times when they are blank
+RANDOM_FRAME_TRIES = 10
+
+# Skip masks kept for the movies played last (see Player.skip_mask)
+SKIP_MASKS_KEPT = 8
+
+# Longest single wait for input, in seconds; SDL's timeout is a 32 bit millisecond count
+MAX_EVENT_WAIT = 60
+
+# Seconds between checks for input while a display waits for the frame server
+SERVED_FRAME_POLL = 0.05
+
+
+def calculate_time_to_play(number_of_frames, time_between_frames, frames_per_iteration):
+    seconds = (number_of_frames * time_between_frames) / frames_per_iteration
+    minutes = seconds / 60
+    hours   = minutes / 60
+    days    = hours   / 24
+
+    # Return the time units that will be easiest for the user to understand
+    if days > 1:
+        return days, "days"
+    elif hours > 1:
+        return hours, "hours"
+    elif minutes > 1:
+        return minutes, "minutes"
+    else:
+        return seconds, "seconds"
+
+
+def choose_random_frame(total_frames, fps, keyframes=None, keyframe_distance=0):
+    """ Picks a random frame number. If the file is long, the first and last five
+    minutes are avoided. If key frames are given, the frame picked is a key frame
+    or at most keyframe_distance frames after one, so it is cheap to decode. """
+    # if long file, avoid beginning and end bits
+    avoid_frames = int(5*60*fps)  # five minutes of frames
+    if total_frames > avoid_frames * 2 + 100:
+        # long file
+        first_frame, last_frame = avoid_frames, total_frames-avoid_frames
+    else:
+        # short file
+        first_frame, last_frame = 1, total_frames-1
+
+    if keyframes:
+        # only consider the key frames inside the allowed range
+        start = bisect_left(keyframes, first_frame)
+        end = bisect_right(keyframes, last_frame)
+        if start < end:
+            keyframe = keyframes[random.randrange(start, end)]
+            return min(keyframe + random.randint(0, keyframe_distance), last_frame)
+
+    return random.randint(first_frame, last_frame)
+
+
+class StopPlayingException(Exception):
+    """ Raise this exception to stop the player """
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def check_for_quit(event):
+    ''' Stops the player if the event is a request to quit '''
+    if event.type == pygame.QUIT:
+        raise StopPlayingException("Quit event")
+    elif event.type == pygame.KEYDOWN:
+        if event.key == pygame.K_ESCAPE:
+            raise StopPlayingException("ESC pressed")
+
+
+class PreparedFrame:
+    """ A frame that is ready to be put on the screen, plus what to report about it """
+    def __init__(self, mp4_file, frame_message, image, position, first_frame, movie_played, playing_time,
+                 checkpoint_state=None, read_only=False):
+        self.mp4_file = mp4_file
+        self.frame_message = frame_message
+        self.image = image              # surface scaled for the screen
+        self.position = position        # where to blit the image on the screen
+        self.first_frame = first_frame  # True for the first frame shown from a movie
+        self.movie_played = movie_played
+        self.playing_time = playing_time
+        self.checkpoint_state = checkpoint_state  # what to save to resume at this frame
+        self.read_only = read_only      # True if the image's pixels must not be drawn on
+
+
+def prepared_frame_bytes(frame):
+    ''' Memory held by a prepared frame, used to cap the prefetch queue '''
+    image = frame.image
+    return image.get_width() * image.get_height() * image.get_bytesize()
+
+
+class WarmMovie:
+    """ The next movie of the directory, opened in the background with its first frame decoded """
+    def __init__(self, mp4_file, decoder, metadata, frame):
+        self.mp4_file = mp4_file
+        self.decoder = decoder
+        self.metadata = metadata
+        self.frame = frame              # BGR array of frame 0, or None if it could not be read
+
+    def release(self):
+        self.decoder.release()
+
+
+class Player:
+    """
+    The slow movie player: picks movies and frames, prepares them in the
+    background and shows each one when it is due.
+
+    'options' are the checked command line arguments (see cli.py).
+    Only what the first frame needs is set up before it is shown; the
+    frame cache, the debug font and indexing the movie library finish
+    in a background thread while playback has already started.
+
+    Example usage:
+        parser = build_parser()
+        options = check_arguments(parser, parser.parse_args(["--mp4", "movie.mp4"]))
+        Player(options).run()
+    """
+
+    def __init__(self, options, metrics=None):
+        self.mp4_file = options.mp4
+        self.delay_between_frames = options.delay
+        self.frames_increment = options.frames_increment
+        self.scale_image = options.no_scale
+        self.use_random_frame_file = options.random   # if None, then this tests false
+        self.debug = options.debug
+        self.initial_frame = options.initial_frame
+        self.play_directory = options.play_directory  # if None, then this tests false
+        self.frame_store_file = options.frame_store   # if None, then this tests false
+        self.frame_server_socket = options.frame_server  # if None, then this tests false
+        self.client_queue = options.client_queue
+        self.prefetch_depth = options.prefetch_depth
+        self.prefetch_memory = options.prefetch_memory
+        self.index_file = options.index_file
+        self.random_policy = options.random_policy
+        self.no_repeat_window = options.no_repeat_window
+        self.weight_by_length = options.weight_by_length
+        self.library_refresh = options.library_refresh
+        self.random_keyframes = options.random_keyframes
+        self.keyframe_distance = options.keyframe_distance
+        self.frame_cache_directory = options.frame_cache  # if None, then this tests false
+        self.frame_cache_size = options.frame_cache_size
+        self.metrics_file = options.metrics_file
+        self.double_buffer = options.double_buffer
+        self.skip_duplicates = options.skip_duplicates
+        self.skip_black = options.skip_black
+        self.crossfade = options.crossfade
+        self.crossfade_movies_only = options.crossfade_movies_only
+        self.crossfade_budget = options.crossfade_budget
+        self.checkpoint_file = options.checkpoint   # if None, then this tests false
+        self.checkpoint_interval = options.checkpoint_interval
+        self.skip_masks = OrderedDict()   # used by the prefetch thread only
+        self.metrics = metrics or Metrics(enabled=False)
+
+        # Memory for frames is counted from now, with OpenCV, NumPy and pygame loaded
+        self.memory_budget = None
+        if options.memory_budget:
+            self.memory_budget = MemoryBudget(options.memory_budget * 1024 * 1024)
+        self.memory_pressure = False  # True while memory use is near the budget
+
+        # Set up by run(); the ones marked background are None until the
+        # background initialization has made them
+        self.screen = None
+        self.screen_width = None
+        self.screen_height = None
+        self.presenter = None
+        self.crossfader = None
+        self.next_file_function = None
+        self.video_index = None
+        self.media_library = None
+        self.frame_converter = None
+        self.frame_cache = None       # background
+        self.debug_overlay = None     # background
+        self.frame_store = None
+        self.scratch_surface = None   # copy of a read-only frame to draw the overlay on
+        self.frame_server = None      # when serving frames to displays
+        self.frame_client = None      # when showing the frames of a frame server
+        self.checkpoint = None
+        self.resume_state = None      # where the last run stopped, if it can be resumed
+        self.background_thread = None
+        self.stopping = threading.Event()
+        self.resumed_movie_done = threading.Event()   # set once a resumed movie has played
+
+        # Time spent decoding each random frame, to compare the random frame policies
+        if self.random_keyframes:
+            self.random_decode_stats = DecodeStats("random frame (key frame aligned)")
+        else:
+            self.random_decode_stats = DecodeStats("random frame (any frame)")
+
+    def open_decoder(self, video_filename, decoder=None):
+        ''' Returns a DecoderSession for the video file, reusing decoder if it is
+        already open on the same file. Returns None if the file can not be opened '''
+        if decoder is not None:
+            if decoder.video_filename == video_filename and decoder.check_file():
+                return decoder
+            decoder.release()
+
+        # Under a memory budget every frame is decoded into the same array; frames
+        # are converted straight after they are read, so none is needed for longer
+        decoder = DecoderSession(video_filename, reuse_frames=self.memory_budget is not None)
+
+        # Check if the video file was opened successfully
+        if not decoder.is_open():
+            print(f"Error: Could not open video file '{video_filename}'.")
+            return None
+
+        return decoder
+
+    def extract_frame(self, decoder, frame_number):
+        video_filename = decoder.video_filename
+        total_frames = decoder.total_frames
+
+        # Check if the specified frame number is valid
+        if frame_number < 0 or frame_number >= total_frames:
+            print(f"Error: Invalid frame number: {frame_number:,}. Total frames:{total_frames:,} in file '{video_filename}'")
+            return
+
+        # Read the frame
+        frame_original = decoder.read(frame_number)
+
+        # Check if the frame was read successfully
+        if frame_original is None:
+            self.metrics.increment("decode_failures")
+            print(f"Error: Failed to read frame {frame_number:,} in file '{video_filename}'.")
+            return
+
+        self.metrics.observe("seek", decoder.last_seek_cost)
+        self.metrics.observe("decode", decoder.last_read_cost - decoder.last_seek_cost)
+
+        if self.debug:
+            frame_aspect_ratio = frame_original.shape[1] / frame_original.shape[0]
+            print(f"frame height={frame_original.shape[0]} width={frame_original.shape[1]} aspect ratio={frame_aspect_ratio}")
+            print(f"decoder grab cost={decoder.grab_cost} seek cost={decoder.seek_cost} grab distance={decoder.grab_distance()}")
+            # Save the frame for debugging
+            output_filename = f"debugframe.jpg"
+            cv2.imwrite(output_filename, frame_original)
+            print(f"Frame {frame_number} extracted and saved to {output_filename}.")
+
+        # The frame is returned as OpenCV's BGR array; color conversion happens after scaling
+        return frame_original
+
+    def prepare_image(self, frame, first_time):
+        ''' Turns an extracted frame into a surface ready to blit and the position to blit it at '''
+        # The converter only recomputes the fit and reallocates its buffers when the frame size changes
+        changed = self.frame_converter.configure(frame.shape[1], frame.shape[0])
+
+        if self.scale_image and (first_time or changed):  # only print this once per movie
+            image_width, image_height = self.frame_converter.frame_size
+            print(f"Screen aspect ratio: {self.screen_width / self.screen_height}, Image aspect ratio: {image_width / image_height}")
+            if self.frame_converter.fit_by_width:
+                print("Scaling using fit by width")
+            else:
+                print("Scaling using fit by height")
+
+        image, position = self.frame_converter.convert(frame)
+
+        if self.debug and self.scale_image:
+            print(f"Image width: {frame.shape[1]} height: {frame.shape[0]}")
+            print(f"Scaled_image width: {image.get_width()} height: {image.get_height()}")
+
+        return image, position
+
+    def checkpoint_mode(self):
+        ''' The mode and source recorded in checkpoints; None in the modes that can not be resumed '''
+        if self.play_directory:
+            return "play_directory", self.play_directory
+        if self.mp4_file and not self.use_random_frame_file and not self.frame_store_file:
+            return "mp4", self.mp4_file
+        return None
+
+    def resumable(self, state):
+        ''' Returns the checkpoint state if playback can carry on from it, else None.
+        Only the checkpointed movie is looked at, and only with a stat '''
+        if state is None:
+            return None
+        mode = self.checkpoint_mode()
+        if mode is None or [state.get("mode"), state.get("source")] != list(mode):
+            return None
+        # an explicit initial frame wins over the checkpoint
+        if self.initial_frame:
+            return None
+        identity = file_identity(state.get("movie", ""))
+        if identity is None or list(identity) != state.get("identity"):
+            # the movie was changed or removed since the checkpoint
+            return None
+        if not 0 <= state.get("frame", -1) < (state.get("metadata") or {}).get("frame_count", 0):
+            return None
+        return state
+
+    def warm_next_movie(self):
+        ''' Runs in the movie warmer's thread while the current movie plays: picks the next
+        movie in the directory, opens it, and reads its metadata and first frame.
+        Returns a WarmMovie, or None if there is no next movie or it can not be read '''
+        mp4_file = self.next_file_function()
+        if mp4_file is None:
+            return None
+        mp4_file = os.path.join(self.play_directory, mp4_file)
+
+        with self.metrics.timer("warm_next_movie"):
+            decoder = self.open_decoder(mp4_file)
+            if decoder is None:
+                return None
+            metadata = self.video_index.get(mp4_file, decoder)
+            if metadata is None or metadata["frame_count"] <= 0:
+                decoder.release()
+                return None
+            frame = self.extract_frame(decoder, 0)
+        return WarmMovie(mp4_file, decoder, metadata, frame)
+
+    def skip_mask(self, mp4_file, decoder, frame_number):
+        ''' The skip mask (see FrameSignatures.skip_mask) of the frames the movie plays:
+        every frames_increment'th frame from frame_number on. None if the movie's frame
+        signatures are not indexed. The masks of the last few movies are kept, so a
+        movie played again, as on every loop of --mp4, is not worked out again. '''
+        frames_increment = self.frames_increment
+        # where the movie starts (--initial_frame or a checkpoint) picks the frames played
+        skip_offset = frame_number % frames_increment
+        key = (mp4_file, decoder.identity, frames_increment, skip_offset, self.skip_duplicates, self.skip_black)
+        skip = self.skip_masks.get(key)
+        if skip is not None:
+            self.skip_masks.move_to_end(key)
+            return skip
+
+        indexed = self.video_index.lookup_signatures(mp4_file, decoder.identity)
+        signatures = indexed.resampled(frames_increment, skip_offset) if indexed is not None else None
+        if signatures is None:
+            if indexed is not None:
+                print(f"Warning: the frame signatures of {mp4_file} are for every {indexed.increment} frames, "
+                      f"which does not match frames {frame_number:,}, {frame_number + frames_increment:,}, ...; no frames skipped")
+            elif self.debug:
+                print(f"No frame signatures for {mp4_file}; no frames skipped")
+            return None
+
+        with self.metrics.timer("skip_mask"):
+            skip = signatures.skip_mask(self.skip_duplicates, self.skip_black)
+        if self.debug:
+            print(f"{int(skip.sum()):,} of {len(skip):,} frames will be skipped")
+        self.skip_masks[key] = skip
+        if len(self.skip_masks) > SKIP_MASKS_KEPT:
+            self.skip_masks.popitem(last=False)
+        return skip
+
+    def stored_frames(self, store):
+        ''' Generator that yields the frames of a frame store ready to display, playing
+        its movies in order and repeating forever. Nothing is decoded; each image is a
+        view into the memory-mapped store. '''
+        # center the stored frames if they were not extracted at the screen's size
+        store_width, store_height = store.size
+        position = (max(0, int((self.screen_width - store_width)/2)), 0)
+
+        movie_played = 0
+        while True:
+            for movie in store.movies:
+                movie_played += 1
+                total_frames = movie["total_frames"]
+                duration, duration_units = calculate_time_to_play(movie["frames"], self.delay_between_frames, 1)
+                playing_time = f"{duration:,.2f} {duration_units}"
+
+                for i in range(movie["frames"]):
+                    frame_number = i * movie["increment"]
+                    percent_played = int((frame_number / total_frames) * 100)
+                    frame_message = f"Playback {movie_played:,} Frame {frame_number:,} of {total_frames:,} ({percent_played}%)"
+                    image = pygame.image.frombuffer(store.frame(movie["start"] + i), store.size, 'RGB')
+                    yield PreparedFrame(movie["path"], frame_message, image, position, i == 0, movie_played, playing_time,
+                                        read_only=True)
+
+    def served_frames(self, client):
+        ''' Generator that yields the frames sent by a frame server ready to display.
+        Nothing is decoded; each image shares its pixels with the client's buffers. '''
+        for info, pixels, size in client.frames():
+            # center the frames if the server scaled them for a screen of another size
+            canvas_width, canvas_height = info["canvas"]
+            x, y = info["position"]
+            position = (x + max(0, int((self.screen_width - canvas_width)/2)),
+                        y + max(0, int((self.screen_height - canvas_height)/2)))
+            image = pygame.image.frombuffer(pixels, size, 'RGB')
+            yield PreparedFrame(info["mp4_file"], info["frame_message"], image, position, info["first_frame"],
+                                info["movie_played"], info["playing_time"])
+
+    def prepared_frames(self, movie_file):
+        ''' Generator that picks the movies and frames to play and yields them ready to display.
+        Runs in the prefetch thread, so it must not touch the display. '''
+        metrics = self.metrics
+        play_directory = self.play_directory
+        use_random_frame_file = self.use_random_frame_file
+        frames_increment = self.frames_increment
+        delay_between_frames = self.delay_between_frames
+        debug = self.debug
+
+        # Count the number of times the movie has been played
+        movie_played = 0
+
+        # What checkpoints record about this mode; None if it can not be resumed
+        checkpoint_mode = self.checkpoint_mode() if self.checkpoint is not None else None
+
+        # The decoder session for the movie being played; kept open between frames
+        decoder = None
+
+        # In play_directory mode the next movie is opened while the current one ends
+        movie_warmer = MovieWarmer(self.warm_next_movie, discard=WarmMovie.release)
+
+        try:
+            # Loop forever as follows:
+            #   - In mp4 mode, play the movie over and over
+            #   - In play_directory mode, after one movie ends, select the next one, and
+            #     after playing the last one, go back to the top of the directory.
+            #   - In random mode, after displaying the frame, pick a new movie and new frame
+            while True:
+                # initialize loop variables
+                play_to_end = True
+                first_time = True
+                playing_time = None
+
+                # if an initial frame was specified on the command line
+                # only start with that frame for the first movie played
+                if movie_played == 0:
+                    frame_number = self.initial_frame
+                    resume = self.resume_state
+                else:
+                    frame_number = 0
+                    resume = None
+                if resume is None:
+                    # past the resumed movie, if there was one, the library may be read
+                    self.resumed_movie_done.set()
+
+                movie_played += 1
+
+                # If the next movie was warmed up while the last one played, switch to it;
+                # its first frame is already decoded
+                warm_movie = movie_warmer.take()
+                warm_frame = None
+                if resume is not None:
+                    # Carry on where the last run stopped; the frame count and frame
+                    # rate were saved in the checkpoint, so nothing else is read
+                    mp4_file = resume["movie"]
+                    frame_number = resume["frame"]
+                    movie_played = resume["iteration"]
+                    metadata = resume["metadata"]
+                    with metrics.timer("open"):
+                        decoder = self.open_decoder(mp4_file, decoder)
+                    if decoder is None:
+                        # wait a frame's delay before trying again, unless the player stops
+                        if self.stopping.wait(delay_between_frames):
+                            return
+                        continue
+                elif warm_movie is not None:
+                    metrics.increment("warm_transitions")
+                    mp4_file = warm_movie.mp4_file
+                    if decoder is not None:
+                        decoder.release()
+                    decoder = warm_movie.decoder
+                    metadata = warm_movie.metadata
+                    warm_frame = warm_movie.frame
+                else:
+                    # If playing all files in the directory, the pick the next mp4 file to play
+                    if play_directory:
+                        mp4_file = self.next_file_function()
+                        if mp4_file is None:
+                            raise StopPlayingException(f"No mp4 files found in directory '{play_directory}'")
+                        mp4_file = os.path.join(play_directory, mp4_file)
+                    else:
+                        mp4_file = movie_file
+
+                    # If playing random frames in random files, pick the file to play
+                    # The library is only checked for new or removed files every so often
+                    if use_random_frame_file:
+                        mp4_file = self.media_library.choose()
+                        if mp4_file is None:
+                            raise StopPlayingException(f"No .mp4 files found in directory '{use_random_frame_file}'")
+
+                    # Open the movie (or keep the already open one) and get its total number of frames
+                    with metrics.timer("open"):
+                        decoder = self.open_decoder(mp4_file, decoder)
+                    if decoder is None:
+                        # the file may have been removed; wait and move on to the next pick
+                        if self.stopping.wait(delay_between_frames):
+                            return
+                        continue
+
+                    # Frame count and frame rate come from the metadata index when the file is unchanged
+                    with metrics.timer("metadata"):
+                        metadata = self.video_index.get(mp4_file, decoder)
+                    if metadata is None:
+                        if self.stopping.wait(delay_between_frames):
+                            return
+                        continue
+                total_frames = metadata["frame_count"]
+                fps = metadata["fps"] or 24
+
+                # If playing random frames in random files, pick the frame to play
+                if use_random_frame_file:
+                    keyframes = self.video_index.get_keyframes(mp4_file) if self.random_keyframes else None
+                    frame_number = choose_random_frame(total_frames, fps, keyframes, self.keyframe_distance)
+
+                    # Pick again, without decoding, while the frame picked is black or blank
+                    if self.skip_black:
+                        signatures = self.video_index.lookup_signatures(mp4_file, decoder.identity)
+                        if signatures is not None:
+                            for _ in range(RANDOM_FRAME_TRIES):
+                                if not signatures.blank_near(frame_number, self.skip_black):
+                                    break
+                                metrics.increment("random_frames_rejected")
+                                frame_number = choose_random_frame(total_frames, fps, keyframes, self.keyframe_distance)
+                else:
+                    duration, duration_units = calculate_time_to_play(total_frames, delay_between_frames, frames_increment)
+                    playing_time = f"{duration:,.2f} {duration_units}"
+
+                # Frames that look the same as the last one shown, or are black, are skipped
+                # without being decoded when the movie's frame signatures are indexed
+                skip = None
+                if (self.skip_duplicates or self.skip_black) and not use_random_frame_file:
+                    skip = self.skip_mask(mp4_file, decoder, frame_number)
+
+                # Scaled frames can be loaded from the frame cache instead of being decoded;
+                # the cache may still be loading in the background for the first movie.
+                # Random frames are hardly ever shown again, so they are not added to it.
+                frame_cache = self.frame_cache
+                use_frame_cache = frame_cache is not None and self.scale_image
+                add_to_frame_cache = use_frame_cache and not use_random_frame_file
+                if use_frame_cache:
+                    cache_size, cache_position, _ = fit_geometry(metadata["width"], metadata["height"], self.screen_width, self.screen_height)
+
+                # Loop to extract and prepare the frames
+                while play_to_end and frame_number < total_frames:
+
+                    if use_random_frame_file:
+                        # don't loop if random file
+                        play_to_end = False
+
+                    # Before the last frame of the movie is shown, start getting the next
+                    # movie ready so the switch to it is as quick as any other frame
+                    if play_directory and frame_number + frames_increment >= total_frames:
+                        movie_warmer.start()
+
+                    if (skip is not None and frame_number // frames_increment < len(skip)
+                            and skip[frame_number // frames_increment]):
+                        metrics.increment("frames_skipped")
+                        frame_number += frames_increment
+                        warm_frame = None
+                        continue
+
+                    # construct the status message
+                    if use_random_frame_file:
+                        frame_message = f"Playback {movie_played:,} Frame {frame_number:,} of {total_frames:,}"
+                    else:
+                        percent_played = int((frame_number / total_frames) * 100)
+                        frame_message = f"Playback {movie_played:,} Frame {frame_number:,} of {total_frames:,} ({percent_played}%)"
+
+                    image = None
+                    if use_frame_cache:
+                        cache_key = frame_key(mp4_file, decoder.identity, frame_number, cache_size, "fit")
+                        with metrics.timer("cache_lookup"):
+                            cached = frame_cache.get(cache_key)
+                        if cached is not None:
+                            metrics.increment("cache_hits")
+                            pixels, pixels_size = cached
+                            image = pygame.image.frombuffer(pixels, pixels_size, 'RGB')
+                            position = cache_position
+                        else:
+                            metrics.increment("cache_misses")
+                        if debug:
+                            print(frame_cache)
+
+                    if image is None:
+                        if warm_frame is not None:
+                            # decoded in the background while the previous movie played
+                            frame = warm_frame
+                        else:
+                            # Extract the frame from the video file
+                            frame = self.extract_frame(decoder, frame_number)
+                        if frame is None:
+                            # the file changed or disappeared; stop playing this movie
+                            if self.stopping.wait(delay_between_frames):
+                                return
+                            break
+
+                        if use_random_frame_file:
+                            self.random_decode_stats.add(decoder.last_read_cost)
+                            if debug:
+                                print(self.random_decode_stats)
+
+                        with metrics.timer("convert"):
+                            image, position = self.prepare_image(frame, first_time)
+                        if add_to_frame_cache and not self.memory_pressure:
+                            frame_cache.put(cache_key, pygame.image.tobytes(image, 'RGB'), image.get_size())
+
+                    checkpoint_state = None
+                    if checkpoint_mode is not None:
+                        checkpoint_state = {
+                            "mode": checkpoint_mode[0],
+                            "source": checkpoint_mode[1],
+                            "movie": mp4_file,
+                            # the directory cycler's position, so the next movie follows this one
+                            "directory_position": os.path.relpath(mp4_file, play_directory) if play_directory else None,
+                            "frame": frame_number,
+                            "iteration": movie_played,
+                            "identity": list(decoder.identity),
+                            "metadata": metadata,
+                        }
+
+                    yield PreparedFrame(mp4_file, frame_message, image, position, first_time, movie_played, playing_time,
+                                        checkpoint_state)
+
+                    frame_number += frames_increment
+                    first_time = False
+                    warm_frame = None
+                # This is the end of the loop that prepares the movie
+            # This is the end of the forever loop.
+
+        finally:
+            movie_warmer.close()
+            if decoder is not None:
+                decoder.release()
+
+    def handle_event(self, event):
+        ''' Stops the player on a request to quit, and redraws the whole screen
+        the next time if the display lost its contents '''
+        check_for_quit(event)
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+            self.presenter.invalidate()
+
+    def wait_for_next_frame(self, scheduler):
+        ''' Sleeps until the next frame is due, waking straight away to handle input '''
+        # before the first frame there is no deadline; it is due now
+        deadline = scheduler.next_deadline()
+        self.wait_until(deadline if deadline is not None else time.monotonic())
+
+    def wait_until(self, deadline):
+        ''' Sleeps until the time.monotonic() deadline, waking straight away to handle input '''
+        # handle anything that arrived while the last frame was being shown
+        for event in pygame.event.get():
+            self.handle_event(event)
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            event = pygame.event.wait(math.ceil(min(remaining, MAX_EVENT_WAIT) * 1000))
+            self.handle_event(event)
+
+    def wait_for_served_frame(self, frames):
+        ''' Waits until the frame server has sent the next frame, handling input
+        meanwhile, so ESC works while the server is slow or can not be reached '''
+        while not frames.wait(SERVED_FRAME_POLL):
+            for event in pygame.event.get():
+                self.handle_event(event)
+
+    def present_fade_step(self, surface):
+        ''' Shows one step of a crossfade; the blended surface covers the whole screen '''
+        self.presenter.present(surface, (0, 0))
+
+    def start_display(self):
+        ''' Opens the full screen display '''
+        # Only the display is started; pygame.init() would also start audio and
+        # other modules the player does not use
+        print("Initializing PyGame...")
+        pygame.display.init()
+
+        # Set up the display
+        print("Setting up the display...")
+        display_info = pygame.display.Info()
+
+        display_flags = pygame.FULLSCREEN
+        if self.double_buffer:
+            # SDL falls back to a software surface if the display can not do this
+            display_flags |= pygame.HWSURFACE | pygame.DOUBLEBUF
+        self.screen = pygame.display.set_mode((display_info.current_w, display_info.current_h), display_flags)
+        self.screen_width = display_info.current_w
+        self.screen_height = display_info.current_h
+        print(f'Screen width: {self.screen_width} height: {self.screen_height}')
+
+        # hide the mouse cursor
+        pygame.mouse.set_visible(False)
+
+        # Puts frames on the display; the bars around the frame are only cleared
+        # when the frame's size or position changes, otherwise only the frame is
+        # sent to the display. Without scaling the bars are red for debugging.
+        if self.scale_image:
+            self.presenter = Presenter(self.screen, background=BLACK_RGB)
+        else:
+            self.presenter = Presenter(self.screen, background=RED_RGB)
+        if self.debug:
+            print(f"Display double buffered: {self.presenter.double_buffered}")
+
+        # Fit the crossfade and prefetch buffers for this screen into the memory budget
+        if self.memory_budget is not None:
+            self.plan_memory()
+
+        # Fades between frames are blended in buffers allocated once, at screen size
+        if self.crossfade:
+            self.crossfader = Crossfader((self.screen_width, self.screen_height), self.crossfade,
+                                         cpu_budget=self.crossfade_budget, background=self.presenter.background)
+
+    def background_init(self):
+        ''' Runs in a background thread once playback has started: sets up what
+        the first frame does not need '''
+        with self.metrics.timer("background_init"):
+            # The debug font is looked up through fontconfig, which can take seconds;
+            # a frame server has no screen to draw on, its displays draw their own
+            if self.debug and self.frame_server is None:
+                pygame.font.init()
+                get_font("arial", 20)
+                self.debug_overlay = DebugOverlay()
+
+            # Reading the frame cache's directory takes a while when it holds many frames
+            if self.frame_cache_directory:
+                self.frame_cache = FrameCache(self.frame_cache_directory, self.frame_cache_size * 1024 * 1024)
+
+        library_directory = self.play_directory or self.use_random_frame_file
+        if library_directory:
+            # When resuming, no other movie is touched until the resumed one has played
+            if self.resume_state is not None:
+                self.resumed_movie_done.wait()
+            if not self.stopping.is_set():
+                with self.metrics.timer("index_library"):
+                    self.index_library(library_directory)
+
+    def index_library(self, library_directory):
+        ''' Indexes the library's movies that are not indexed yet so picking them later is quick '''
+        indexed = 0
+        for name in sorted(os.listdir(library_directory)):
+            if self.stopping.is_set():
+                return
+            path = os.path.join(library_directory, name)
+            if name.endswith(".mp4") and self.video_index.lookup(path) is None:
+                if self.video_index.get(path) is not None:
+                    indexed += 1
+        if indexed:
+            print(f"{indexed:,} movies added to the index '{self.index_file}'")
+        if self.media_library is not None and self.weight_by_length:
+            # the lengths of the newly indexed movies are known now
+            self.media_library.update_weights()
+
+    def plan_memory(self):
+        ''' Turns crossfading off and decodes fewer frames ahead if their buffers do
+        not fit in --memory_budget '''
+        budget = self.memory_budget
+        frame_bytes = self.screen_width * self.screen_height * 3
+
+        # The frame being prepared, the one waiting to be shown, the one on the screen
+        # and the converter's resized frame are needed however small the budget is
+        if not budget.reserve("frames", 4 * frame_bytes):
+            print(f"Warning: --memory_budget is too small for frames of {self.screen_width}x{self.screen_height}; "
+                  f"use at least {math.ceil(4 * frame_bytes / PLANNED_SHARE / 1024 / 1024):,} MB")
+
+        # Fading needs three screens of its own; it was asked for, so it comes before prefetching
+        if self.crossfade and self.screen is not None:
+            if not budget.reserve("crossfade", 3 * frame_bytes):
+                print(f"Not enough --memory_budget to crossfade at {self.screen_width}x{self.screen_height}; frames will not fade")
+                self.crossfade = 0
+
+        # A frame server keeps a copy of each frame queued for its displays
+        if self.frame_server is not None:
+            budget.reserve("frame server", (self.client_queue + 1) * frame_bytes)
+
+        # Every frame decoded ahead of time needs a buffer of its own
+        depth = min(self.prefetch_depth, max(0, budget.available() // frame_bytes))
+        budget.reserve("prefetch", depth * frame_bytes)
+        if depth < self.prefetch_depth:
+            print(f"Decoding {depth} frames ahead instead of {self.prefetch_depth} to stay within --memory_budget")
+        self.prefetch_depth = depth
+        self.prefetch_memory = min(self.prefetch_memory, math.ceil(depth * frame_bytes / 1024 / 1024))
+        if self.debug:
+            print(budget)
+
+    def check_memory(self, frames):
+        ''' Does less while memory use is near --memory_budget: decodes at most one
+        frame ahead, does not fade and does not add frames to the frame cache '''
+        pressure = self.memory_budget.under_pressure()
+        self.metrics.set_gauge("memory_budget_used_bytes", self.memory_budget.last_used)
+        if pressure == self.memory_pressure:
+            return
+        self.memory_pressure = pressure
+        if pressure:
+            self.metrics.increment("memory_pressure")
+            print("Memory use is near --memory_budget; doing less until it goes down")
+            frames.depth = min(1, self.prefetch_depth)
+        else:
+            print("Memory use is back under --memory_budget")
+            frames.depth = self.prefetch_depth
+
+    def open_frame_source(self):
+        ''' Sets up where the frames come from and returns a FramePrefetcher of them,
+        ready to show on a screen of screen_width x screen_height '''
+        # A display of a frame server only shows what the server sends
+        if self.frame_server_socket:
+            # frames are always received in the prefetch thread, so the display can
+            # handle input while it waits for them
+            depth = max(1, self.prefetch_depth)
+            # the received pixels are shared with the images, so there is a buffer for
+            # every frame that can be alive at once, as with the frame converter
+            self.frame_client = FrameClient(self.frame_server_socket, buffers=self.frame_buffers(depth))
+            return FramePrefetcher(self.served_frames(self.frame_client), depth=depth,
+                memory_cap=self.prefetch_memory * 1024 * 1024, frame_bytes=prepared_frame_bytes)
+
+        # Where the last run stopped, when that can be carried on from
+        if self.checkpoint_file:
+            self.checkpoint = Checkpoint(self.checkpoint_file, self.checkpoint_interval)
+            self.resume_state = self.resumable(self.checkpoint.load())
+            if self.resume_state is not None:
+                print(f"Resuming {self.resume_state['movie']} at frame {self.resume_state['frame']:,} (iteration {self.resume_state['iteration']:,})")
+
+        if self.play_directory:
+            # When resuming, the directory is carried on from the movie being resumed
+            start_after = self.resume_state["directory_position"] if self.resume_state else None
+            self.next_file_function = get_next_file(self.play_directory, filetype='mp4', start_after=start_after)
+
+        # Metadata of the movies, so each one is only examined once
+        self.video_index = VideoIndex(self.index_file)
+
+        # The movies to pick random frames from, read once and refreshed now and then
+        if self.use_random_frame_file:
+            movie_length = None
+            if self.weight_by_length:
+                video_index = self.video_index
+                movie_length = lambda path: (video_index.lookup(path) or {}).get("frame_count")
+            self.media_library = MediaLibrary(self.use_random_frame_file, "mp4", policy=self.random_policy,
+                                              no_repeat_window=self.no_repeat_window, weight=movie_length,
+                                              refresh_seconds=self.library_refresh)
+
+        # Converts decoded frames into surfaces for this screen. Surfaces share their
+        # pixels with the converter's buffers, so there must be a buffer for every frame
+        # that can be alive at once: queued, being prepared, and on the screen.
+        self.frame_converter = FrameConverter((self.screen_width, self.screen_height), scale=self.scale_image,
+                                              buffers=self.frame_buffers(self.prefetch_depth))
+
+        # Decode and scale upcoming frames in the background while the current one is shown
+        if self.frame_store_file:
+            # Frames extracted ahead of time need no decoding, only mapping
+            self.frame_store = FrameStore(self.frame_store_file)
+            print(f"Playing {len(self.frame_store):,} frames of {self.frame_store.size[0]}x{self.frame_store.size[1]} from '{self.frame_store_file}'")
+            frame_source = self.stored_frames(self.frame_store)
+        else:
+            frame_source = self.prepared_frames(self.mp4_file)
+
+        return FramePrefetcher(frame_source, depth=self.prefetch_depth,
+            memory_cap=self.prefetch_memory * 1024 * 1024, frame_bytes=prepared_frame_bytes)
+
+    def frame_buffers(self, depth):
+        ''' The number of screen sized buffers needed for the frames that can be alive
+        at once: the ones the prefetch queue can hold within depth and --prefetch_memory,
+        the one being prepared, the one waiting to be shown and the one on the screen '''
+        frame_bytes = self.screen_width * self.screen_height * 3
+        # the queue always takes one frame, however large it is
+        queued = min(depth, max(1, self.prefetch_memory * 1024 * 1024 // frame_bytes))
+        return queued + 3
+
+    def drawable(self, image):
+        ''' Returns a copy of image that can be drawn on. The same surface is used
+        for every copy; the screen and the crossfader keep copies of their own. '''
+        if self.scratch_surface is None or self.scratch_surface.get_size() != image.get_size():
+            self.scratch_surface = pygame.Surface(image.get_size(), 0, image)
+        self.scratch_surface.blit(image, (0, 0))
+        return self.scratch_surface
+
+    def first_frame_shown(self):
+        ''' Starts setting up everything the first frame did not need, while it is shown '''
+        time_to_first_frame = process_age_seconds()
+        self.metrics.set_gauge("time_to_first_frame_seconds", time_to_first_frame)
+        print(f"Time to first frame: {time_to_first_frame:,.2f} seconds")
+        self.background_thread = threading.Thread(target=self.background_init, name="background-init", daemon=True)
+        self.background_thread.start()
+
+    def run(self):
+        ''' Plays until ESC is pressed or the window is closed '''
+        self.start_display()
+
+        frames = self.open_frame_source()
+
+        # Frames are due at fixed times measured from the first frame, so the time
+        # spent preparing a frame does not add to the delay. The displays of a frame
+        # server show each frame when it arrives; the server keeps the time.
+        scheduler = None
+        if self.frame_client is None:
+            scheduler = FrameScheduler(self.delay_between_frames)
+
+        metrics = self.metrics
+        try:
+            while True:
+                # Normally the next frame is already waiting in the prefetch queue
+                with metrics.timer("wait_for_frame"):
+                    if self.frame_client is not None:
+                        self.wait_for_served_frame(frames)
+                    frame = next(frames, None)
+                if frame is None:
+                    break
+                mp4_file = frame.mp4_file
+
+                if frame.first_frame and not self.use_random_frame_file:
+                    # print some stats
+                    print(f"Playing {mp4_file}. Iteration {frame.movie_played}.")
+                    print(f"Time to play: {frame.playing_time}")
+
+                print(mp4_file, frame.frame_message)
+
+                # The overlay is only there once the background initialization has loaded the font
+                if self.scale_image and self.debug_overlay is not None:
+                    if not self.use_random_frame_file:
+                        file_info = f"{mp4_file} ({frame.playing_time})"
+                    else:
+                        file_info = f"{mp4_file}"
+                    with metrics.timer("text_overlay"):
+                        if frame.read_only:
+                            # frames of a store are mapped read-only; draw on a copy
+                            frame.image = self.drawable(frame.image)
+                        self.debug_overlay.draw(frame.image, file_info, frame.frame_message)
+
+                # wait until the frame is due; ESC and quit are handled as soon as they arrive
+                if scheduler is not None:
+                    self.wait_for_next_frame(scheduler)
+                else:
+                    for event in pygame.event.get():
+                        self.handle_event(event)
+
+                # Fade from the frame on the screen to this one; with --crossfade_movies_only
+                # only the first frame of each movie fades in
+                crossfader = self.crossfader
+                fade = (crossfader is not None and crossfader.has_frame and not self.memory_pressure
+                        and (frame.first_frame or not self.crossfade_movies_only))
+                drift = None
+                if fade:
+                    # the frame is due when its fade starts
+                    if scheduler is not None:
+                        drift = scheduler.frame_shown()
+                    with metrics.timer("crossfade"):
+                        crossfader.fade(frame.image, frame.position, self.present_fade_step, self.wait_until)
+
+                # Blit the prepared image onto the screen and send what changed to the display
+                with metrics.timer("present"):
+                    self.presenter.present(frame.image, frame.position)
+                if crossfader is not None and not fade:
+                    # keep the crossfader's copy of the screen up to date for the next fade
+                    crossfader.set_frame(frame.image, frame.position)
+
+                # How late this frame went on the screen compared to its deadline
+                if drift is None and scheduler is not None:
+                    drift = scheduler.frame_shown()
+                if drift is not None:
+                    metrics.set_gauge("schedule_drift_seconds", drift)
+                metrics.increment("frames_shown")
+                if self.memory_budget is not None:
+                    self.check_memory(frames)
+
+                # Remember where playback is; written at most every --checkpoint_interval seconds
+                if self.checkpoint is not None and frame.checkpoint_state is not None:
+                    with metrics.timer("checkpoint"):
+                        self.checkpoint.record(frame.checkpoint_state)
+                if self.background_thread is None:
+                    self.first_frame_shown()
+                if self.debug and drift is not None:
+                    print(f"Schedule drift: {drift * 1000:,.1f} ms")
+
+            # This is the end of the loop that plays the frames.
+
+        except StopPlayingException as e:
+            print(f"{e}")
+
+        except Exception as e:
+            with open(ERROR_LOG, 'a') as file:
+                msg = traceback.format_exc()
+                file.write(f"An error occurred:\n {msg}\n")
+
+        finally:
+            # Always stop the prefetch thread and clean up pygame before exiting.
+            self.finish(frames)
+
+    def serve(self, socket_path, frame_size):
+        ''' Decodes and scales each frame once, for frame_size, and sends it to every
+        display connected to socket_path when it is due. Runs until interrupted. '''
+        # There is no display; the frames are prepared for the displays' size
+        self.screen_width, self.screen_height = frame_size
+        print(f"Serving frames of {self.screen_width}x{self.screen_height} on '{socket_path}'")
+        self.frame_server = FrameServer(socket_path, queue_frames=self.client_queue)
+        if self.memory_budget is not None:
+            self.plan_memory()
+
+        frames = self.open_frame_source()
+        scheduler = FrameScheduler(self.delay_between_frames)
+
+        metrics = self.metrics
+        try:
+            while True:
+                with metrics.timer("wait_for_frame"):
+                    frame = next(frames, None)
+                if frame is None:
+                    break
+
+                if frame.first_frame and not self.use_random_frame_file:
+                    print(f"Serving {frame.mp4_file}. Iteration {frame.movie_played}.")
+                    print(f"Time to play: {frame.playing_time}")
+                print(frame.mp4_file, frame.frame_message)
+
+                # wait until the frame is due
+                self.stopping.wait(scheduler.time_until_next())
+
+                # The pixels are copied once, out of the converter's buffers, and the
+                # same copy is sent to every display
+                info = {
+                    "mp4_file": frame.mp4_file,
+                    "frame_message": frame.frame_message,
+                    "position": frame.position,
+                    "canvas": frame_size,
+                    "first_frame": frame.first_frame,
+                    "movie_played": frame.movie_played,
+                    "playing_time": frame.playing_time,
+                }
+                with metrics.timer("publish"):
+                    self.frame_server.publish(info, pygame.image.tobytes(frame.image, 'RGB'), frame.image.get_size())
+
+                drift = scheduler.frame_shown()
+                metrics.set_gauge("schedule_drift_seconds", drift)
+                metrics.set_gauge("frame_server_clients", self.frame_server.client_count())
+                metrics.increment("frames_served")
+                if self.memory_budget is not None:
+                    self.check_memory(frames)
+
+                if self.checkpoint is not None and frame.checkpoint_state is not None:
+                    with metrics.timer("checkpoint"):
+                        self.checkpoint.record(frame.checkpoint_state)
+                if self.background_thread is None:
+                    self.first_frame_shown()
+                if self.debug:
+                    print(f"Schedule drift: {drift * 1000:,.1f} ms")
+
+        except (StopPlayingException, KeyboardInterrupt) as e:
+            print(f"{str(e) or 'Interrupted'}")
+
+        except Exception as e:
+            with open(ERROR_LOG, 'a') as file:
+                msg = traceback.format_exc()
+                file.write(f"An error occurred:\n {msg}\n")
+
+        finally:
+            self.finish(frames)
+
+    def finish(self, frames):
+        ''' Stops the background threads, closes everything run() or serve() opened
+        and prints the stats '''
+        # tells the background threads to stop, ending any wait before a retry
+        self.stopping.set()
+        # wakes the background initialization if it waits for a resumed movie to end
+        self.resumed_movie_done.set()
+        if self.frame_client is not None:
+            # wakes the prefetch thread if it is waiting for the frame server
+            self.frame_client.close()
+        stopped = frames.close()
+        if self.background_thread is not None:
+            self.background_thread.join(5)
+            stopped = stopped and not self.background_thread.is_alive()
+        if self.metrics_file:
+            self.metrics.write_file(self.metrics_file)
+        self.metrics.close()
+        if self.use_random_frame_file:
+            print(self.random_decode_stats)
+        if self.frame_cache is not None:
+            print(self.frame_cache)
+        if self.debug_overlay is not None:
+            print(self.debug_overlay)
+        if self.debug and self.presenter is not None:
+            print(self.presenter)
+            if self.crossfader is not None:
+                print(self.crossfader)
+        if self.memory_budget is not None:
+            print(self.memory_budget)
+        if self.frame_server is not None:
+            print(self.frame_server)
+            self.frame_server.close()
+        if self.frame_client is not None:
+            print(self.frame_client)
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            if self.debug:
+                print(self.checkpoint)
+        if not stopped:
+            # a thread still busy, for example reading a slow file, may still use them;
+            # they are released when the process exits
+            print("Warning: background threads did not stop; the index, the frame store, the directory watches and the display are left open")
+        else:
+            if self.next_file_function is not None:
+                self.next_file_function.listing.close()
+            if self.media_library is not None:
+                self.media_library.close()
+            if self.video_index is not None:
+                self.video_index.close()
+            if self.frame_store is not None:
+                self.frame_store.close()
+            pygame.quit()
+        print("Slow movie player has ended")
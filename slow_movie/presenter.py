@@ -0,0 +1,67 @@
+import pygame
+
+
+class Presenter:
+    """
+    Puts prepared frames on the display, pushing only the pixels that
+    changed.
+
+    The letterbox bars around a scaled frame never change, so the screen
+    is only cleared to the background color when the frame's rectangle
+    (its size or position) changes. After that only the frame's rectangle
+    is blitted and sent to the display with pygame.display.update(rects),
+    which is much cheaper than a full flip on slow framebuffers and SPI
+    displays where the bars are a large part of the screen.
+
+    With a double-buffered display the two buffers take turns, so each
+    one has to be cleared once after a geometry change and every update
+    is a full flip.
+
+    Example usage:
+        presenter = Presenter(screen, background=(0, 0, 0))
+        presenter.present(image, position)
+        print(presenter)   # how many full and partial updates were done
+    """
+
+    def __init__(self, screen, background=(0, 0, 0)):
+        self.screen = screen
+        self.background = background
+        self.double_buffered = bool(screen.get_flags() & pygame.DOUBLEBUF)
+        self.rect = None
+        # buffers that still have to be cleared for the current geometry
+        self.clears_left = 0
+        self.full_updates = 0
+        self.partial_updates = 0
+
+    def present(self, image, position):
+        ''' Blits image at position and pushes it to the display. Returns the
+        rectangle of the screen that changed '''
+        rect = image.get_rect(topleft=position)
+        if rect != self.rect:
+            # new geometry: the bars have to be cleared in every buffer
+            self.rect = rect
+            self.clears_left = 2 if self.double_buffered else 1
+
+        if self.clears_left:
+            self.clears_left -= 1
+            self.screen.fill(self.background)
+            self.screen.blit(image, rect)
+            pygame.display.flip()
+            self.full_updates += 1
+            return self.screen.get_rect()
+
+        changed = self.screen.blit(image, rect)
+        if self.double_buffered:
+            pygame.display.flip()
+        else:
+            pygame.display.update(changed)
+        self.partial_updates += 1
+        return changed
+
+    def invalidate(self):
+        ''' Makes the next present() redraw the whole screen, for example
+        after the display was restored '''
+        self.rect = None
+
+    def __str__(self):
+        return f"Presenter: {self.full_updates:,} full screen updates, {self.partial_updates:,} frame only updates"
@@ -0,0 +1,236 @@
+import os
+import time
+
+import cv2
+
+# Number of frames to grab forward before the first seek has been timed.
+DEFAULT_GRAB_DISTANCE = 30
+
+# Weight given to the newest measurement in the running cost averages.
+COST_SMOOTHING = 0.2
+
+
+def _running_average(average, measurement):
+    ''' Exponentially weighted running average; the first measurement seeds it '''
+    if average is None:
+        return measurement
+    return average + COST_SMOOTHING * (measurement - average)
+
+
+def file_identity(video_filename):
+    ''' Returns (size, mtime) for the file or None if the file can not be found '''
+    try:
+        stat = os.stat(video_filename)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def scan_keyframes(video_filename):
+    ''' Returns the sorted frame numbers of the key frames in the video file. The
+    compressed packets are read without being decoded, so this is much faster than
+    playing the file. Returns None if OpenCV can not report key frames. '''
+    has_key_frame = getattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME", None)
+    if has_key_frame is None:
+        return None
+
+    # CAP_PROP_FORMAT -1 makes grab() return raw packets instead of decoding them
+    cap = cv2.VideoCapture(video_filename, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not cap.isOpened():
+        return None
+
+    keyframes = []
+    try:
+        frame_number = 0
+        while cap.grab():
+            if cap.get(has_key_frame):
+                keyframes.append(frame_number)
+            frame_number += 1
+    finally:
+        cap.release()
+
+    return keyframes or None
+
+
+class DecodeStats:
+    """ Running count and mean of the time spent reading frames """
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total_seconds += seconds
+
+    def mean(self):
+        return self.total_seconds / self.count if self.count else 0.0
+
+    def __str__(self):
+        return f"Mean decode time per {self.label}: {self.mean() * 1000:,.1f} ms over {self.count:,} frames"
+
+
+class DecoderSession:
+    """
+    Keeps a video file open for the life of a movie so that frames can be
+    read without reopening the file for every frame.
+
+    A frame a short distance ahead of the current position is reached by
+    grabbing (decoding without converting) the frames in between. A frame
+    further away, or behind the current position, is reached with a real
+    seek. The cut-over distance is the measured cost of a seek divided by
+    the measured cost of a grab.
+
+    Before every read the file's size and modification time are checked.
+    If the file was replaced the session reopens it, and if the file
+    disappeared the session closes and read() returns None.
+
+    With reuse_frames, every frame is decoded into the same array, so a
+    frame is only valid until the next one is read; a 4K movie then does
+    not allocate a new 24 MB array for every frame.
+
+    Example usage:
+        decoder = DecoderSession("movie.mp4")
+        if decoder.is_open():
+            frame = decoder.read(100)   # BGR numpy array or None
+        decoder.release()
+    """
+
+    def __init__(self, video_filename, max_grab_distance=None, reuse_frames=False):
+        self.video_filename = video_filename
+        self.max_grab_distance = max_grab_distance
+        self.reuse_frames = reuse_frames
+        # the array frames are decoded into with reuse_frames
+        self.frame_buffer = None
+        self.cap = None
+        self.identity = None
+        self.total_frames = 0
+        self.fps = 0.0
+        self.width = 0
+        self.height = 0
+        # index of the frame the next cap.read() will return
+        self.position = 0
+        # running averages, in seconds, of one grab and of one seek
+        self.grab_cost = None
+        self.seek_cost = None
+        # seconds taken by the most recent read(), and by positioning within it
+        self.last_read_cost = 0.0
+        self.last_seek_cost = 0.0
+        self.open()
+
+    def open(self):
+        ''' (Re)opens the video file. Returns True if the file could be opened '''
+        self.release()
+        self.identity = file_identity(self.video_filename)
+        if self.identity is None:
+            return False
+
+        cap = cv2.VideoCapture(self.video_filename)
+        if not cap.isOpened():
+            cap.release()
+            return False
+
+        self.cap = cap
+        self.total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.fps = cap.get(cv2.CAP_PROP_FPS)
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.position = 0
+        return True
+
+    def release(self):
+        ''' Closes the video file. The session can be reopened with open() '''
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = None
+        self.frame_buffer = None
+
+    def is_open(self):
+        return self.cap is not None
+
+    def check_file(self):
+        ''' Reopens the file if it changed on disk. Returns False if it is gone '''
+        identity = file_identity(self.video_filename)
+        if identity is None:
+            self.release()
+            return False
+        if identity != self.identity or self.cap is None:
+            return self.open()
+        return True
+
+    def grab_distance(self):
+        ''' The largest gap that is cheaper to grab through than to seek over '''
+        if self.max_grab_distance is not None:
+            return self.max_grab_distance
+        if self.grab_cost is None or self.seek_cost is None or self.grab_cost <= 0:
+            return DEFAULT_GRAB_DISTANCE
+        return int(self.seek_cost / self.grab_cost)
+
+    def _grab_to(self, frame_number):
+        ''' Decodes forward to frame_number. Returns False if the stream ended '''
+        gap = frame_number - self.position
+        start = time.monotonic()
+        for _ in range(gap):
+            if not self.cap.grab():
+                return False
+            self.position += 1
+        if gap > 0:
+            self.grab_cost = _running_average(self.grab_cost, (time.monotonic() - start) / gap)
+        return True
+
+    def _seek_to(self, frame_number):
+        start = time.monotonic()
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        self.seek_cost = _running_average(self.seek_cost, time.monotonic() - start)
+        self.position = frame_number
+
+    def seek(self, frame_number):
+        ''' Positions the stream so the next decode() returns frame_number, grabbing
+        forward or seeking, whichever is cheaper. Returns False if that failed '''
+        gap = frame_number - self.position
+        if 0 <= gap <= self.grab_distance():
+            return self._grab_to(frame_number)
+        self._seek_to(frame_number)
+        return True
+
+    def decode(self):
+        ''' Decodes the frame at the current position. Returns a BGR numpy array or None '''
+        if self.reuse_frames:
+            # OpenCV decodes into the array when it has the frame's size, else makes a new one
+            ret, frame = self.cap.read(self.frame_buffer)
+            if ret:
+                self.frame_buffer = frame
+        else:
+            ret, frame = self.cap.read()
+        if not ret:
+            return None
+        self.position += 1
+        return frame
+
+    def read(self, frame_number):
+        ''' Returns the frame as a BGR numpy array, or None if it can not be read '''
+        start = time.monotonic()
+        frame = self._read(frame_number)
+        self.last_read_cost = time.monotonic() - start
+        return frame
+
+    def _read(self, frame_number):
+        if not self.check_file():
+            return None
+        if frame_number < 0 or frame_number >= self.total_frames:
+            return None
+
+        start = time.monotonic()
+        positioned = self.seek(frame_number)
+        self.last_seek_cost = time.monotonic() - start
+        if positioned:
+            frame = self.decode()
+            if frame is not None:
+                return frame
+
+        # The stream got out of step with the file (truncated, rewritten in
+        # place, or a backend error). Reopen once and seek straight there.
+        if not self.open() or frame_number >= self.total_frames:
+            return None
+        self._seek_to(frame_number)
+        return self.decode()
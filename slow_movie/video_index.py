@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import threading
+from array import array
+from functools import partial
+from multiprocessing import Pool
+
+import cv2
+
+from .frame_signatures import FrameSignatures, compute_signatures
+from .video_decoder import file_identity, scan_keyframes
+
+DEFAULT_INDEX_FILE = "video_index.db"
+
+METADATA_FIELDS = ("frame_count", "fps", "width", "height", "codec")
+
+
+def fourcc_to_string(fourcc):
+    ''' Converts the integer FOURCC code reported by OpenCV to its four characters '''
+    fourcc = int(fourcc)
+    return "".join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def decoder_metadata(decoder):
+    ''' Returns the metadata dictionary for an open DecoderSession '''
+    return {
+        "frame_count": decoder.total_frames,
+        "fps": decoder.fps,
+        "width": decoder.width,
+        "height": decoder.height,
+        "codec": fourcc_to_string(decoder.cap.get(cv2.CAP_PROP_FOURCC)),
+    }
+
+
+def probe_video(video_filename):
+    ''' Opens the video file and returns (identity, metadata), or None if it can not be opened '''
+    identity = file_identity(video_filename)
+    if identity is None:
+        return None
+    cap = cv2.VideoCapture(video_filename)
+    try:
+        if not cap.isOpened():
+            return None
+        metadata = {
+            "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "codec": fourcc_to_string(cap.get(cv2.CAP_PROP_FOURCC)),
+        }
+    finally:
+        cap.release()
+    return identity, metadata
+
+
+def _probe_for_pool(video_filename, keyframes=False, signatures_increment=None):
+    probed = probe_video(video_filename)
+    if probed is None:
+        return video_filename, None, None, None
+    found_keyframes = scan_keyframes(video_filename) if keyframes else None
+    signatures = compute_signatures(video_filename, signatures_increment) if signatures_increment else None
+    return video_filename, probed, found_keyframes, signatures
+
+
+class VideoIndex:
+    """
+    Stores the metadata of video files (frame count, fps, width, height
+    and codec) in a local SQLite database so that it only has to be read
+    from a video file once. The frame numbers of each file's key frames
+    and the signatures of its frames (see FrameSignatures) can be stored
+    as well.
+
+    Entries are keyed by the absolute path of the file and remember the
+    file's size and modification time. An entry whose file has changed
+    or disappeared is treated as missing and is replaced the next time
+    the file is looked up.
+
+    Example usage:
+        index = VideoIndex("video_index.db")
+        metadata = index.get("/videos/movie.mp4")
+        print(metadata["frame_count"], metadata["fps"])
+    """
+
+    def __init__(self, index_filename=DEFAULT_INDEX_FILE):
+        self.index_filename = index_filename
+        # the player looks files up from the prefetch thread
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(index_filename, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " frame_count INTEGER NOT NULL,"
+            " fps REAL NOT NULL,"
+            " width INTEGER NOT NULL,"
+            " height INTEGER NOT NULL,"
+            " codec TEXT NOT NULL)")
+        # frames holds the key frame numbers as an array of unsigned ints;
+        # empty means the file was scanned but its key frames are unknown
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS keyframes ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " frames BLOB NOT NULL)")
+        # luma holds the frame signatures of every increment'th frame
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " increment INTEGER NOT NULL,"
+            " luma BLOB NOT NULL)")
+        self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def lookup(self, video_filename, identity=None):
+        ''' Returns the stored metadata, or None if it is missing or out of date '''
+        if identity is None:
+            identity = file_identity(video_filename)
+            if identity is None:
+                return None
+        path = os.path.abspath(video_filename)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, " + ", ".join(METADATA_FIELDS) +
+                " FROM videos WHERE path = ?", (path,)).fetchone()
+        if row is None or tuple(row[:2]) != tuple(identity):
+            return None
+        return dict(zip(METADATA_FIELDS, row[2:]))
+
+    def store(self, video_filename, identity, metadata):
+        path = os.path.abspath(video_filename)
+        values = (path, identity[0], identity[1]) + tuple(metadata[f] for f in METADATA_FIELDS)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO videos (path, size, mtime_ns, " + ", ".join(METADATA_FIELDS) +
+                ") VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+            self.connection.commit()
+
+    def get(self, video_filename, decoder=None):
+        ''' Returns the metadata for the file, reading it from the file if it is not
+        indexed yet. An already open DecoderSession is used instead of opening the
+        file again. Returns None if the file can not be opened. '''
+        identity = file_identity(video_filename)
+        if identity is None:
+            return None
+        metadata = self.lookup(video_filename, identity)
+        if metadata is not None:
+            return metadata
+
+        if decoder is not None and decoder.is_open() and decoder.identity == identity:
+            metadata = decoder_metadata(decoder)
+        else:
+            probed = probe_video(video_filename)
+            if probed is None:
+                return None
+            identity, metadata = probed
+        self.store(video_filename, identity, metadata)
+        return metadata
+
+    def lookup_keyframes(self, video_filename, identity=None):
+        ''' Returns the stored key frame numbers, an empty list if the file was
+        scanned without finding any, or None if they are missing or out of date '''
+        if identity is None:
+            identity = file_identity(video_filename)
+            if identity is None:
+                return None
+        path = os.path.abspath(video_filename)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, frames FROM keyframes WHERE path = ?", (path,)).fetchone()
+        if row is None or tuple(row[:2]) != tuple(identity):
+            return None
+        frames = array("I")
+        frames.frombytes(row[2])
+        return frames.tolist()
+
+    def store_keyframes(self, video_filename, identity, keyframes):
+        path = os.path.abspath(video_filename)
+        frames = array("I", keyframes or []).tobytes()
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO keyframes (path, size, mtime_ns, frames) VALUES (?, ?, ?, ?)",
+                (path, identity[0], identity[1], frames))
+            self.connection.commit()
+
+    def get_keyframes(self, video_filename):
+        ''' Returns the key frame numbers for the file, scanning the file the first time.
+        Returns an empty list if the key frames can not be found. '''
+        identity = file_identity(video_filename)
+        if identity is None:
+            return []
+        keyframes = self.lookup_keyframes(video_filename, identity)
+        if keyframes is None:
+            keyframes = scan_keyframes(video_filename) or []
+            self.store_keyframes(video_filename, identity, keyframes)
+        return keyframes
+
+    def lookup_signatures(self, video_filename, identity=None):
+        ''' Returns the stored FrameSignatures, or None if they are missing or out of date '''
+        if identity is None:
+            identity = file_identity(video_filename)
+            if identity is None:
+                return None
+        path = os.path.abspath(video_filename)
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT size, mtime_ns, increment, luma FROM signatures WHERE path = ?", (path,)).fetchone()
+        if row is None or tuple(row[:2]) != tuple(identity):
+            return None
+        return FrameSignatures.from_bytes(row[2], row[3])
+
+    def store_signatures(self, video_filename, identity, signatures):
+        path = os.path.abspath(video_filename)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO signatures (path, size, mtime_ns, increment, luma) VALUES (?, ?, ?, ?, ?)",
+                (path, identity[0], identity[1], signatures.increment, signatures.to_bytes()))
+            self.connection.commit()
+
+    def remove_missing(self):
+        ''' Drops the entries of files that no longer exist. Returns how many were dropped '''
+        with self.lock:
+            paths = [row[0] for row in self.connection.execute("SELECT path FROM videos")]
+        missing = [(path,) for path in paths if not os.path.exists(path)]
+        with self.lock:
+            self.connection.executemany("DELETE FROM videos WHERE path = ?", missing)
+            self.connection.executemany("DELETE FROM keyframes WHERE path = ?", missing)
+            self.connection.executemany("DELETE FROM signatures WHERE path = ?", missing)
+            self.connection.commit()
+        return len(missing)
+
+
+def _signatures_stale(index, video_filename, increment):
+    signatures = index.lookup_signatures(video_filename)
+    return signatures is None or signatures.increment != increment
+
+
+def build_index(directory, index_filename=DEFAULT_INDEX_FILE, filetype="mp4", processes=None, keyframes=False,
+                signatures_increment=None):
+    ''' Indexes every file of 'filetype' in the directory, probing the files that are
+    new or changed in parallel on all cores. If keyframes is True the key frames of
+    each file are indexed too, and with signatures_increment the signatures of every
+    signatures_increment'th frame. Returns (files indexed, files that failed) '''
+    index = VideoIndex(index_filename)
+    try:
+        index.remove_missing()
+        files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                       if f.endswith("." + filetype))
+        stale = [f for f in files if index.lookup(f) is None
+                 or (keyframes and index.lookup_keyframes(f) is None)
+                 or (signatures_increment and _signatures_stale(index, f, signatures_increment))]
+        print(f"Indexing {len(stale):,} of {len(files):,} .{filetype} files in '{directory}'")
+
+        failed = 0
+        if stale:
+            with Pool(processes or os.cpu_count()) as pool:
+                probe = partial(_probe_for_pool, keyframes=keyframes, signatures_increment=signatures_increment)
+                for video_filename, probed, found_keyframes, signatures in pool.imap_unordered(probe, stale):
+                    if probed is None:
+                        print(f"Error: Could not open video file '{video_filename}'.")
+                        failed += 1
+                        continue
+                    identity, metadata = probed
+                    index.store(video_filename, identity, metadata)
+                    if keyframes:
+                        index.store_keyframes(video_filename, identity, found_keyframes)
+                    if signatures is not None:
+                        index.store_signatures(video_filename, identity, signatures)
+                    print(f"{video_filename}: {metadata['frame_count']:,} frames "
+                          f"{metadata['width']}x{metadata['height']} {metadata['fps']:.2f} fps {metadata['codec']}"
+                          + (f" {len(found_keyframes or []):,} key frames" if keyframes else "")
+                          + (f" {len(signatures):,} frame signatures" if signatures is not None else ""))
+        return len(files) - failed, failed
+    finally:
+        index.close()
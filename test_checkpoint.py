@@ -0,0 +1,146 @@
+# Program to test the checkpoint used by --checkpoint to resume playback
+#
+# Records states in a temporary directory and loads them back the way a
+# restart after a crash or power cut would: a journal line cut short, a
+# journal left over from before the snapshot was written (its states are
+# numbered lower), compaction into the snapshot after COMPACT_RECORDS
+# lines, a missing or corrupt snapshot, and states held back by the
+# interval until close().
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+from slow_movie import checkpoint
+from slow_movie.checkpoint import COMPACT_RECORDS, Checkpoint
+
+
+def state(frame):
+    return {"movie": "movie.mp4", "frame": frame}
+
+
+def loaded_frame(filename):
+    ''' The frame of the state a new Checkpoint loads, as on a restart; None if there is none '''
+    loaded = Checkpoint(filename).load()
+    return None if loaded is None else loaded["frame"]
+
+
+def self_test(directory):
+    filename = os.path.join(directory, "smp.checkpoint")
+    journal_filename = filename + ".journal"
+
+    # nothing recorded yet
+    assert loaded_frame(filename) is None, "loaded a state before any was recorded"
+
+    # every state is written when the interval is 0; the last one is loaded
+    saved = Checkpoint(filename, interval=0)
+    for frame in range(1, 6):
+        assert saved.record(state(frame)), f"state {frame} was not written"
+    assert loaded_frame(filename) == 5, "the last state was not loaded"
+    assert not os.path.exists(filename), "the snapshot was written before the journal was full"
+
+    # a line cut short by a crash is ignored; the state before it is loaded
+    saved.close()
+    with open(journal_filename, "ab") as file:
+        file.write(json.dumps(dict(state(6), version=checkpoint.VERSION, sequence=6)).encode("utf-8")[:20])
+    assert loaded_frame(filename) == 5, "a torn journal line was loaded"
+
+    # after a restart the torn line is dropped and new states can be read again
+    saved = Checkpoint(filename, interval=0)
+    assert saved.load()["frame"] == 5, "the state before the torn line was not loaded"
+    saved.record(state(7))
+    saved.close()
+    assert loaded_frame(filename) == 7, "the state written after a torn line was not loaded"
+    with open(journal_filename, "rb") as file:
+        lines = file.read().split(b"\n")
+    assert lines[-1] == b"" and all(json.loads(line) for line in lines[:-1]), "the torn line was left in the journal"
+
+    # states carry on being numbered after the one loaded
+    assert saved.sequence == 6, f"sequence {saved.sequence} after 6 states were recorded"
+
+    # the journal is compacted into the snapshot after COMPACT_RECORDS lines
+    saved = Checkpoint(filename, interval=0)
+    saved.load()
+    frame = 100
+    while saved.journal_records < COMPACT_RECORDS:
+        frame += 1
+        saved.record(state(frame))
+    frame += 1
+    saved.record(state(frame))
+    assert os.path.exists(filename), f"no snapshot after {COMPACT_RECORDS} journal lines"
+    assert os.path.getsize(journal_filename) == 0, "the journal was not emptied when the snapshot was written"
+    assert loaded_frame(filename) == frame, "the compacted state was not loaded"
+    snapshot_sequence = saved.sequence
+    saved.close()
+
+    # a journal left over by a crash while compacting holds older states; the newer snapshot wins
+    with open(journal_filename, "wb") as file:
+        older = dict(state(50), version=checkpoint.VERSION, sequence=snapshot_sequence - 10)
+        file.write(json.dumps(older).encode("utf-8") + b"\n")
+    assert loaded_frame(filename) == frame, "an older journal line replaced the newer snapshot"
+
+    # a newer journal line wins over the snapshot
+    with open(journal_filename, "ab") as file:
+        newer = dict(state(500), version=checkpoint.VERSION, sequence=snapshot_sequence + 1)
+        file.write(json.dumps(newer).encode("utf-8") + b"\n")
+    assert loaded_frame(filename) == 500, "a newer journal line did not replace the snapshot"
+
+    # a corrupt snapshot is ignored, the journal is still used
+    with open(filename, "wb") as file:
+        file.write(b"{\"movie\": \"movie.mp4\", \"fra")
+    assert loaded_frame(filename) == 500, "the journal was not used with a corrupt snapshot"
+
+    # a snapshot of another version is ignored
+    with open(filename, "w") as file:
+        json.dump(dict(state(900), version=checkpoint.VERSION + 1, sequence=snapshot_sequence + 100), file)
+    assert loaded_frame(filename) == 500, "a snapshot of another version was loaded"
+
+    # a missing snapshot: the journal alone is enough
+    os.remove(filename)
+    assert loaded_frame(filename) == 500, "the journal was not used without a snapshot"
+
+    # a corrupt snapshot and no journal: there is nothing to resume
+    with open(filename, "wb") as file:
+        file.write(b"\x00" * 16)
+    os.remove(journal_filename)
+    assert loaded_frame(filename) is None, "a corrupt snapshot was loaded"
+
+    # within the interval a state is held back, and written by close()
+    saved = Checkpoint(filename, interval=60)
+    assert saved.record(state(1000)), "the first state was not written"
+    assert not saved.record(state(1001)), "a state was written within the interval"
+    assert loaded_frame(filename) == 1000, "the state held back was loaded"
+    saved.close()
+    assert loaded_frame(filename) == 1001, "close() did not write the state held back"
+
+    print("All checkpoint tests passed")
+    return True
+
+
+parser = argparse.ArgumentParser(
+    description="Program to test the checkpoint used to resume playback"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-d", "--directory"
+    ,default=None
+    ,help="directory to make the temporary checkpoint files in, for example on the SD card (default: the system's temporary directory)"
+    )
+
+args = parser.parse_args()
+
+directory = tempfile.mkdtemp(prefix="checkpoint_test_", dir=args.directory)
+try:
+    passed = self_test(directory)
+except AssertionError as e:
+    print(f"Test failed: {e}")
+    passed = False
+except Exception:
+    print(f"Unexpected exception!\n{traceback.format_exc()}")
+    passed = False
+finally:
+    shutil.rmtree(directory, ignore_errors=True)
+sys.exit(0 if passed else 1)
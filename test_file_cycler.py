@@ -2,19 +2,115 @@
 # Go through the specified directory and look for
 # files with the specified file type.
 # print the next file name every 2 seconds
+#
+# With --self_test FILES a temporary directory with that many
+# files is created instead and the cycler is checked for order,
+# wrap-around, files added and deleted between calls, multiple
+# file types, recursive scanning, symbolic link loops, and speed.
 
 import argparse
+import os
+import shutil
 import sys
+import tempfile
 import time
 import traceback
 
-from file_cycler import get_next_file
+from slow_movie import file_cycler
+from slow_movie.file_cycler import get_next_file
+
+
+def touch(path):
+    with open(path, "w"):
+        pass
+
+
+def wait_for_settle():
+    ''' Lets the directory modification time age so the listing is cached '''
+    time.sleep(file_cycler.MTIME_SETTLE_SECONDS + 0.1)
+
+
+def self_test(file_count, use_inotify):
+    directory = tempfile.mkdtemp(prefix="file_cycler_test_")
+    try:
+        print(f"Creating {file_count:,} files in '{directory}'")
+        names = [f"movie{i:07d}.mp4" for i in range(file_count)]
+        for name in names:
+            touch(os.path.join(directory, name))
+        # files of other types must be skipped
+        for i in range(max(1, file_count // 10)):
+            touch(os.path.join(directory, f"notes{i:07d}.txt"))
+        wait_for_settle()
+
+        next_file_function = get_next_file(directory, filetype="mp4", use_inotify=use_inotify)
+        listing = next_file_function.listing
+        detection = "inotify" if listing.inotify is not None else "polling"
+        print(f"Detecting directory changes with {detection}")
+
+        # every file in sorted order, then wrap around to the first one
+        start = time.perf_counter()
+        returned = [next_file_function() for _ in range(file_count)]
+        elapsed = time.perf_counter() - start
+        assert returned == names, "files were not returned in sorted order"
+        assert next_file_function() == names[0], "did not wrap around to the first file"
+        assert listing.scans == 1, f"directory was read {listing.scans} times instead of once"
+        print(f"Cycled through {file_count:,} files in {elapsed:.2f} s "
+              f"({elapsed / file_count * 1_000_000:.1f} us per call), directory read once")
+
+        # a file added after the current one is returned next
+        added = names[0][:-len(".mp4")] + "a.mp4"
+        touch(os.path.join(directory, added))
+        assert next_file_function() == added, "added file was not returned next"
+        if file_count > 1:
+            assert next_file_function() == names[1], "did not continue after the added file"
+
+        # when the last file returned is deleted, start over at the top
+        os.remove(os.path.join(directory, added))
+        current = names[1] if file_count > 1 else names[0]
+        os.remove(os.path.join(directory, current))
+        expected = names[0] if file_count > 1 else None
+        assert next_file_function() == expected, "did not restart at the top after a delete"
+        print("Added and deleted files handled")
+
+        # several file types and sub directories
+        os.mkdir(os.path.join(directory, "more"))
+        touch(os.path.join(directory, "more", "extra.mkv"))
+        touch(os.path.join(directory, "zz.mkv"))
+        # a symbolic link back to the top makes a loop that must not be followed
+        os.symlink(directory, os.path.join(directory, "more", "loop"))
+        wait_for_settle()
+        recursive_function = get_next_file(directory, filetype=["mp4", "mkv"], recursive=True,
+                                           use_inotify=use_inotify)
+        first = recursive_function()
+        assert first == os.path.join("more", "extra.mkv"), f"unexpected first file '{first}'"
+        assert recursive_function() == names[0], "mp4 files not listed with mkv files"
+        listed = recursive_function.listing.files()
+        assert len(listed) == len(set(listed)) == file_count + 1, f"{len(listed):,} files listed through the symbolic link loop"
+        print("Multiple file types, recursive scanning and symbolic link loops handled")
+
+        # the directory going away
+        shutil.rmtree(directory)
+        assert next_file_function() is None, "missing directory did not return None"
+
+        listing.close()
+        recursive_function.listing.close()
+        print("All file_cycler tests passed")
+        return True
+
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        return False
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
 
 parser = argparse.ArgumentParser(
     description="Program to test the file_cycler module"
     ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
     )
-parser.add_argument("directory" 
+parser.add_argument("directory"
+    ,nargs="?"
     ,default="."
     ,help="Look in this directory"
     )
@@ -22,11 +118,26 @@ parser.add_argument("-t", "--file-type"
     ,default=None
     ,help="Only list files with this type"
     )
+parser.add_argument("-s", "--self_test"
+    ,type=int
+    ,metavar="FILES"
+    ,help="Create a temporary directory with this many files and check the cycler (try 100000)"
+    )
+parser.add_argument("--poll"
+    ,action="store_true"
+    ,help="Detect directory changes by polling the modification time instead of inotify"
+    )
 
-args = parser.parse_args()    
+args = parser.parse_args()
 directory = args.directory
 file_type = args.file_type
 
+if args.self_test:
+    passed = self_test(args.self_test, use_inotify=not args.poll)
+    if not args.poll:
+        passed = self_test(args.self_test, use_inotify=False) and passed
+    sys.exit(0 if passed else 1)
+
 if file_type:
     print(f"Scanning directory '{directory}' for '{file_type}' files.")
 else:
@@ -37,7 +148,7 @@ next_file_function = get_next_file(directory,filetype=file_type)
 try:
     while True:
         file_returned = next_file_function()
-        if file_returned: 
+        if file_returned:
             print(file_returned) # Get first file
             time.sleep(1)
         else:
@@ -53,4 +164,3 @@ except KeyboardInterrupt:
 except Exception as e:
     print(f"Unexpected exception!\n{traceback.format_exc()}")
     # print(traceback.format_exc())
-
@@ -0,0 +1,80 @@
+# Program to test the frame signatures used by --skip_duplicates and --skip_black
+#
+# Builds signatures of made-up frame sequences and checks which frames
+# skip_mask() skips: a still shot, a slow fade that changes the picture a
+# little every frame, a cut, black frames, the one frame in max_skipped
+# that is always shown, and resampling from an offset (--initial_frame).
+
+import argparse
+import sys
+import traceback
+
+import numpy as np
+
+from slow_movie.frame_signatures import SIGNATURE_SIZE, FrameSignatures
+
+CELLS = SIGNATURE_SIZE * SIGNATURE_SIZE
+
+
+def frames(*levels):
+    ''' Signatures of frames with a pattern around the given brightness levels '''
+    pattern = np.tile([-20, 20], CELLS // 2)
+    return FrameSignatures(1, np.array([np.clip(level + pattern, 0, 255) for level in levels], np.uint8))
+
+
+def self_test(threshold):
+    # a still shot: only the first frame is shown
+    skip = frames(*[100] * 10).skip_mask(duplicate_threshold=threshold)
+    assert list(skip) == [False] + [True] * 9, f"still shot: {skip}"
+
+    # a slow fade: every frame is 1 brighter than the one before, less than the
+    # threshold, but a frame is shown each time the picture has changed by the threshold
+    levels = [60 + i for i in range(40)]
+    skip = frames(*levels).skip_mask(duplicate_threshold=threshold)
+    shown = [level for level, skipped in zip(levels, skip) if not skipped]
+    assert len(shown) >= len(levels) // threshold, f"slow fade: only {shown} shown"
+    assert all(b - a <= threshold for a, b in zip(shown, shown[1:])), f"slow fade: gaps in {shown}"
+    assert shown[-1] >= levels[-1] - threshold, f"slow fade: the end of the fade {levels[-1]} was not shown"
+
+    # a cut is always shown
+    skip = frames(100, 100, 200, 200).skip_mask(duplicate_threshold=threshold)
+    assert list(skip) == [False, True, False, True], f"cut: {skip}"
+
+    # black frames are skipped, frames after them are compared with the last frame shown
+    skip = frames(100, 0, 0, 100, 150).skip_mask(duplicate_threshold=threshold, black_level=16)
+    assert list(skip) == [False, True, True, True, False], f"black frames: {skip}"
+
+    # however alike the frames are, one in max_skipped is shown
+    skip = frames(*[100] * 10).skip_mask(duplicate_threshold=threshold, max_skipped=4)
+    assert list(skip) == [False, True, True, True, False, True, True, True, False, True], f"max_skipped: {skip}"
+
+    # resampling from an offset, as when starting at --initial_frame
+    signatures = frames(*range(10))
+    assert list(signatures.resampled(3, 1).luma[:, 1]) == [21, 24, 27], "resampled from an offset"
+    assert FrameSignatures(2, signatures.luma).resampled(4, 1) is None, "offset not sampled"
+
+    print("All frame signature tests passed")
+    return True
+
+
+parser = argparse.ArgumentParser(
+    description="Program to test the frame signatures used to skip frames"
+    ,epilog="More information and source code at https://github.com/makeralchemy/slow-movie-player-python"
+    )
+parser.add_argument("-d", "--duplicate_threshold"
+    ,type=int
+    ,default=3
+    ,help="the --skip_duplicates threshold to test with"
+    )
+
+args = parser.parse_args()
+
+try:
+    passed = self_test(args.duplicate_threshold)
+except AssertionError as e:
+    print(f"Test failed: {e}")
+    passed = False
+except Exception:
+    print(f"Unexpected exception!\n{traceback.format_exc()}")
+    passed = False
+sys.exit(0 if passed else 1)